@@ -1,69 +1,124 @@
+import time
 import shlex
-import aiohttp
-import uvloop
 import asyncio
-import discord
 import logging
 import argparse
+from profiler import startup_profile
+
+with startup_profile.phase("config"):
+    from config import config, help_embed
+with startup_profile.phase("discord"):
+    import aiohttp
+    import discord
+with startup_profile.phase("role_system"):
+    from commands.role_system import roles, role_handler
+
+import uvloop
 import commands
-import datetime
+import metrics
+import deletions
+import downloader
+from guild_index import index
+from imaging import pool
 from cmd_manager import dispatcher
-from config import config, help_text
-from cmd_manager.bot_args import parser, HelpException, UnkownCommandException
+from cmd_manager.edits import EditIndex
+from cmd_manager.bot_args import parser, parse_command, HelpException, UnkownCommandException
 from handle_messages import private_msg_code, delete_user_message, send_log_message
 from commands.vote_command import add_vote, remove_vote, ongoing_votes, anon_votes
-from commands.role_system import roles, role_handler
 from cmd_manager.filters import EX_SERVER, EX_WELCOME_CHANNEL
 from utils import prison_inmates, check_and_release
 
-uvloop.install()
-loop = uvloop.new_event_loop()
-asyncio.set_event_loop(loop)
 
-client = discord.Client()
-commands.load_commands()
+class Client(discord.Client):
+    async def close(self):
+        # client.run closes the loop afterwards, the download session has to go before
+        await downloader.close()
+        await super().close()
+
+
+client = None
+loop = None
+edit_index = EditIndex()
+
+
+def setup():
+    """Create the client and load the commands. Not done on import, the worker processes of the pool import the main
+    module again and must not start a second bot."""
+    global client, loop
+    if client is not None:
+        return client
+    with startup_profile.phase("uvloop"):
+        uvloop.install()
+        loop = uvloop.new_event_loop()
+        asyncio.set_event_loop(loop)
+    client = Client()
+    for handler in (on_ready, on_message, on_message_edit, on_member_join, on_member_remove, on_member_update,
+                    on_user_update, on_guild_remove, on_raw_reaction_add, on_raw_reaction_remove):
+        client.event(handler)
+    with startup_profile.phase("load_commands"):
+        commands.load_commands()
+    return client
 
 
-@client.event
 async def on_ready():
     logging.info(f'Logged in as\nUsername: {client.user.name}\nID: {client.user.id}\nAPI Version: {discord.__version__}')
     gameplayed = discord.Game(name=config.MAIN.get("gameplayed", "Yuri is Love!"))
     await client.change_presence(activity=gameplayed)
+    index.clear()  # rebuilt from the new guild objects on the next lookup
+    startup_profile.finish()
 
 
-@client.event
 async def on_message(message: discord.Message):
-    await handle_commands(message)
+    await handle_tracked_commands(message)
 
 
-@client.event
 async def on_message_edit(_: discord.Message, message: discord.Message):
-    await handle_commands(message)
+    # embeds unfurling, pins etc. fire edits too, only re-run a command when its text changed
+    if edit_index.unchanged(message.id, message.content):
+        return
+    await handle_tracked_commands(message)
+
+
+async def handle_tracked_commands(message: discord.Message):
+    if not message.content.startswith(">>"):
+        return await handle_commands(message)
+
+    superseded = edit_index.supersede(message.id)
+    if superseded is not None:
+        # the old job unwinds first, it gives back its rate limit tokens before the new version asks for them
+        await asyncio.wait([superseded])
+    task = asyncio.ensure_future(handle_commands(message))
+    edit_index.track(message.id, message.content, task, command_name(message.content))
+    await task
+
+
+def command_name(content):
+    # the first word after '>>', the command is routed on it before the arguments are tokenised
+    name = content[2:].split(None, 1)
+    return name[0] if name else ""
 
 
-@client.event
 async def on_member_join(mem: discord.Member):
+    index.update_member(mem)
     if mem.guild.id == EX_SERVER:
         await send_log_message(f"{mem.display_name} has joined the server",
                                discord.Embed.Empty, mem, discord.Colour.green(), client)
         channel = client.get_channel(EX_WELCOME_CHANNEL)
         mention = await channel.send(f"<@!{mem.id}>")
-        text = help_text("bot_bot", "welcome_set")["member_join"]
-        member_mes = await channel.send(embed=discord.Embed(description=text, color=333333))
-        await asyncio.sleep(300)
-        await delete_user_message(member_mes)
-        await delete_user_message(mention)
+        member_mes = await channel.send(embed=help_embed("bot_bot", "welcome_set", "member_join", colour=333333))
+        deletions.schedule(mention, 300)
+        deletions.schedule(member_mes, 300)
 
 
-@client.event
 async def on_member_remove(mem: discord.Member):
+    index.remove_member(mem)
     if mem.guild.id == EX_SERVER:
         await send_log_message(f"{mem.display_name} has left the server",
                                discord.Embed.Empty, mem, discord.Colour.red(), client)
 
 
-@client.event
 async def on_member_update(before: discord.Member, after: discord.Member):
+    index.update_member(after)
     if after.guild.id == EX_SERVER:
         if before.nick != after.nick:
             await send_log_message(f"{before.display_name if before.nick is None else before.nick} "
@@ -73,8 +128,15 @@ async def on_member_update(before: discord.Member, after: discord.Member):
             await send_log_message(f"{before.name} changed their username", f"New username {after.name}",
                                    after, discord.Colour.orange(), client)
 
-        
-@client.event
+
+async def on_user_update(_: discord.User, after: discord.User):
+    index.update_user(after)
+
+
+async def on_guild_remove(guild: discord.Guild):
+    index.clear(guild)
+
+
 async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     if payload.user_id == client.user.id:
         return
@@ -87,7 +149,6 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
         await handle_vote_reaction(payload, reaction_added=True)
 
 
-@client.event
 async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
     if payload.user_id == client.user.id:
         return
@@ -134,29 +195,41 @@ async def handle_commands(message: discord.Message):
 
     if is_guild and message.guild.id == EX_SERVER:
         if message.channel.id == EX_WELCOME_CHANNEL:
-            await delete_user_message(message)  # no return here
+            deletions.schedule(message, 0)  # no return here, bursts of messages are deleted in bulk
 
     if not message.content.startswith(">>") or len(message.content) == 2:  # prevent forwarding '>>' messages
         return
 
-    if is_guild:
-        today = datetime.datetime.today().strftime("%a %d %b %H:%M:%S")
-        logging.info(f"Date: {today} User: {message.author} Server: {message.guild.name} "
-                     f"Channel: {message.channel.name} Command: {message.content[:50]}")
+    # route on the first word before tokenising, unknown commands are dropped right here
+    name = command_name(message.content)
+    if name not in dispatcher.commands and name not in ("-h", "--help") and not commands.load_command(name):
+        return
+
+    start = time.perf_counter()
+    try:
+        await run_command(name, message)
+    finally:
+        if is_guild:
+            logging.info("Command: %s", message.content[:50],
+                         extra={"command": name, "guild": message.guild.name, "channel": message.channel.name,
+                                "user": message.author, "latency": time.perf_counter() - start})
 
+
+async def run_command(name: str, message: discord.Message):
     try:
-        arg_string = message.clean_content[2:]
-        arg_string = shlex.split(message.clean_content[2:])
-        args = parser.parse_args(arg_string)
+        with metrics.metrics.timed(name, "parse"):
+            arg_string = shlex.split(message.clean_content[2:])
+            if name in dispatcher.commands:
+                args = parse_command(name, arg_string[1:])
+            else:
+                args = parser.parse_args(arg_string)
     except ValueError as err:
         return await private_msg_code(message, str(err))
     except HelpException as err:
         await delete_user_message(message)
         return await private_msg_code(message, str(err))
     except (UnkownCommandException, argparse.ArgumentError) as err:
-        if arg_string[0] in dispatcher.commands:
-            return await private_msg_code(message, str(err))
-        return
+        return await private_msg_code(message, str(err))
 
     return await dispatcher.handle(args.command, client, message, args)
 
@@ -165,6 +238,13 @@ def main():
     while True:
         try:
             logging.info("Start discord run")
+            # worker processes for the vapoursynth commands
+            with startup_profile.phase("worker pool"):
+                pool.start()
+            # event loop lag and the prometheus file
+            metrics.start()
+            # delayed message deletions, including the ones pending from the last run
+            deletions.start(client)
             # start the prison release task
             asyncio.ensure_future(check_and_release(client))
             # bot-Bot
@@ -174,8 +254,10 @@ def main():
         except aiohttp.ClientConnectorError:
             continue
         except KeyboardInterrupt:
+            pool.shutdown()
             return loop.close()
 
 
 if __name__ == "__main__":
+    setup()
     main()
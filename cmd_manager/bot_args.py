@@ -30,3 +30,21 @@ class BotArgParse(argparse.ArgumentParser):
 
 parser = BotArgParse(prog=">>", usage=">>", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 subparsers = parser.add_subparsers(dest="command")
+# command name -> its subparser, filled by register_command
+command_parsers = {}
+# parser options of every command that can be stored in the command manifest
+command_options = {}
+# subparsers added from the manifest, register_command fills them once the module is imported
+placeholders = set()
+
+
+def add_placeholder(name, options):
+    command_parsers[name] = subparsers.add_parser(name, **options)
+    command_options[name] = options
+    placeholders.add(name)
+
+
+def parse_command(name, arg_strings):
+    args = command_parsers[name].parse_args(arg_strings)
+    args.command = name
+    return args
@@ -1,11 +1,16 @@
 from . import dispatcher
-from .bot_args import subparsers
+from .bot_args import subparsers, command_parsers, command_options, placeholders
 
 
-def register_command(name, is_enabled=None, is_admin=None, **kwargs):
+def register_command(name, is_enabled=None, is_admin=None, concurrency=None, queue_depth=None, priority=None,
+                     user_limit=None, command_limit=None, supersede=None, **kwargs):
     def decorator(func):
         # TODO check if formatter_class needs to be provided here
-        parser = subparsers.add_parser(name, **kwargs)
+        if name in placeholders:
+            placeholders.discard(name)
+            parser = command_parsers[name]
+        else:
+            parser = subparsers.add_parser(name, **kwargs)
         if hasattr(func, "_cmd_args"):
             for arg_args, arg_kwargs in func._cmd_args:
                 parser.add_argument(*arg_args, **arg_kwargs)
@@ -15,7 +20,10 @@ def register_command(name, is_enabled=None, is_admin=None, **kwargs):
             for arg_args, arg_kwargs in func._cmd_group:
                 group.add_argument(*arg_args, **arg_kwargs)
 
-        dispatcher.register(name, func, is_enabled, is_admin)
+        command_parsers[name] = parser
+        command_options[name] = {k: v for k, v in kwargs.items() if isinstance(v, (str, int, float, bool))}
+        dispatcher.register(name, func, is_enabled, is_admin, concurrency, queue_depth, priority, user_limit,
+                            command_limit, supersede)
         return func
 
     return decorator
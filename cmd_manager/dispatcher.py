@@ -1,5 +1,24 @@
+import heapq
+import asyncio
+import logging
 import discord
+import itertools
+from math import ceil
+from collections import Counter
 from typing import Callable, NamedTuple
+from metrics import metrics, current_command
+from handle_messages import private_msg
+from .ratelimit import Limit, RateLimiter
+
+# lower runs first when commands wait for a free slot
+PRIORITY_MODERATION = 0
+PRIORITY_ADMIN = 1
+PRIORITY_DEFAULT = 2
+
+# commands running at the same time over all commands
+max_running = 32
+# commands per time over all commands and users, moderation and admin commands don't count
+global_limit = Limit(100, 10)
 
 
 class Command(NamedTuple):
@@ -7,19 +26,130 @@ class Command(NamedTuple):
     func: Callable
     is_enabled: Callable = None
     is_admin: Callable = None
+    concurrency: int = 4  # runs of this command at the same time
+    queue_depth: int = 16  # runs waiting for a slot before new ones are rejected as busy
+    priority: int = PRIORITY_DEFAULT
+    supersede: bool = False  # an edit of the message cancels the running job of its previous version
 
 commands = {}
 
 
-def register(name: str, func: Callable, is_enabled: Callable, is_admin: Callable):
-    commands[name] = Command(name, func, is_enabled, is_admin)
+class Scheduler:
+    def __init__(self, max_running):
+        self.max_running = max_running
+        self.running = 0
+        self.waiters = []  # heap of (priority, order, future)
+        self.order = itertools.count()
+        self.pending = Counter()  # command name -> queued and running
+        self.semaphores = {}
+        self.side_tasks = set()
+
+    def is_busy(self, command):
+        return self.pending[command.name] >= command.concurrency + command.queue_depth
+
+    async def run(self, command, *args):
+        self.pending[command.name] += 1
+        try:
+            if command.name not in self.semaphores:
+                self.semaphores[command.name] = asyncio.Semaphore(command.concurrency)
+            semaphore = self.semaphores[command.name]
+            with metrics.timed(command.name, "wait"):
+                await semaphore.acquire()
+                try:
+                    await self.acquire(command.priority)
+                except BaseException:
+                    semaphore.release()
+                    raise
+            try:
+                with metrics.timed(command.name, "execute"):
+                    await command.func(*args)
+            finally:
+                self.release()
+                semaphore.release()
+        finally:
+            self.pending[command.name] -= 1
+
+    async def acquire(self, priority):
+        if self.running < self.max_running and not self.waiters:
+            self.running += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():  # the slot was already handed over
+                self.release()
+            raise
+
+    def release(self):
+        # hand the slot to the next waiter, cancelled waiters are skipped
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.side_tasks.add(task)
+        task.add_done_callback(self.side_task_done)
+        return task
+
+    def side_task_done(self, task):
+        self.side_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Side task failed: {task.exception()!r}")
+
+
+scheduler = Scheduler(max_running)
+limiter = RateLimiter(global_limit)
+metrics.add_gauge("command_pending", "Queued and running runs per command.", lambda: dict(scheduler.pending))
+metrics.add_gauge("commands_running", "Commands holding a run slot.", lambda: {"all": scheduler.running})
+metrics.add_gauge("commands_waiting", "Commands waiting for a run slot.", lambda: {"all": len(scheduler.waiters)})
+
+
+def register(name: str, func: Callable, is_enabled: Callable, is_admin: Callable, concurrency: int = None,
+             queue_depth: int = None, priority: int = None, user_limit: Limit = None, command_limit: Limit = None,
+             supersede: bool = None):
+    if priority is None:
+        priority = PRIORITY_ADMIN if is_admin else PRIORITY_DEFAULT
+    # a spam flood empties the global bucket, exactly when the moderators need their commands
+    limiter.add_command(name, user_limit, command_limit, global_exempt=priority < PRIORITY_DEFAULT)
+    options = {"concurrency": concurrency, "queue_depth": queue_depth, "priority": priority, "supersede": supersede}
+    commands[name] = Command(name, func, is_enabled, is_admin, **{k: v for k, v in options.items() if v is not None})
+
+
+def refund(name: str, user_id: int):
+    """Give back the rate limit tokens of a run that didn't do the actual work (wrong input, cached result)."""
+    limiter.refund(name, user_id)
+
+
+def spawn(coro):
+    """Fire and forget, the task is tracked until it finished and errors are logged."""
+    return scheduler.spawn(coro)
 
 
 async def handle(name: str, client: discord.Client, message: discord.Message, args):
     command = commands[name]
-    if command.is_admin and not command.is_admin(client, message):
-        return
-    elif command.is_enabled and not command.is_enabled(message):
-        return
-    else:
-        await command.func(client, message, args)
+    metrics.runs[name] += 1
+    current_command.set(name)
+    with metrics.timed(name, "filter"):
+        if command.is_admin and not command.is_admin(client, message):
+            return
+        elif command.is_enabled and not command.is_enabled(message):
+            return
+
+    if scheduler.is_busy(command):
+        return await private_msg(message, f"Too many {name} commands are running, pls try it again later.")
+
+    retry_after = limiter.acquire(name, message.author.id)
+    if retry_after:
+        return await private_msg(message, f"Cooldown, pls wait {ceil(retry_after)}s before using {name} again.")
+    try:
+        await scheduler.run(command, client, message, args)
+    except asyncio.CancelledError:  # superseded by an edit of the message, the new version needs the tokens
+        refund(name, message.author.id)
+        raise
@@ -0,0 +1,53 @@
+import time
+import hashlib
+from collections import OrderedDict
+from . import dispatcher
+
+
+class EditIndex:
+    """
+    Remembers the content of handled messages, so edits only re-run commands when the text changed.
+    An edit cancels the job of the previous version only for commands registered with supersede,
+    others like votes keep running and the edit starts a new one.
+    """
+    def __init__(self, max_size=2048, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # message id -> (content hash, time, task, command name)
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+    def unchanged(self, message_id, content):
+        entry = self.entries.get(message_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return False
+        return entry[0] == self.content_hash(content)
+
+    @staticmethod
+    def cancel(entry):
+        _, _, task, name = entry
+        command = dispatcher.commands.get(name)
+        if task is None or task.done() or command is None or not command.supersede:
+            return None
+        task.cancel()
+        return task
+
+    def supersede(self, message_id):
+        """Cancels the job of an earlier version of the message and returns it, so the caller can wait for it."""
+        entry = self.entries.get(message_id)
+        return self.cancel(entry) if entry is not None else None
+
+    def track(self, message_id, content, task=None, name=None):
+        old = self.entries.pop(message_id, None)
+        if old is not None:
+            self.cancel(old)  # a job of the previous version that started meanwhile
+
+        now = time.monotonic()
+        self.entries[message_id] = (self.content_hash(content), now, task, name)
+        while self.entries:
+            _, (_, added, _, _) = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_size and now - added <= self.ttl:
+                break
+            self.entries.popitem(last=False)
@@ -0,0 +1,73 @@
+import time
+from typing import NamedTuple
+
+
+class Limit(NamedTuple):
+    tokens: int  # uses in a burst
+    per: float  # seconds until all tokens are back
+
+
+class TokenBucket:
+    """
+    Token buckets keyed by an int (user id, 0 for a single bucket).
+    Every bucket is stored as the time it is full again, so there is nothing to expire,
+    buckets in the past are full and get pruned once the dict grows.
+    """
+    min_prune_size = 1024
+
+    def __init__(self, tokens, per):
+        self.interval = per / tokens
+        self.burst = per - self.interval  # how far the full time may lie ahead for a token to be left
+        self.full_at = {}
+        self.prune_size = self.min_prune_size
+
+    def retry_after(self, key, now):
+        return max(self.full_at.get(key, now) - now - self.burst, 0.0)
+
+    def consume(self, key, now):
+        self.full_at[key] = max(self.full_at.get(key, now), now) + self.interval
+        if len(self.full_at) > self.prune_size:
+            self.full_at = {k: full_at for k, full_at in self.full_at.items() if full_at > now}
+            self.prune_size = max(self.min_prune_size, 2 * len(self.full_at))
+
+    def refund(self, key):
+        if key in self.full_at:
+            self.full_at[key] -= self.interval
+
+
+class RateLimiter:
+    def __init__(self, global_limit=None):
+        self.global_bucket = global_limit and TokenBucket(*global_limit)
+        self.user_buckets = {}
+        self.command_buckets = {}
+        self.global_exempt = set()  # commands the global bucket doesn't apply to
+
+    def add_command(self, name, user_limit=None, command_limit=None, global_exempt=False):
+        if global_exempt:
+            self.global_exempt.add(name)
+        if user_limit:
+            self.user_buckets[name] = TokenBucket(*user_limit)
+        if command_limit:
+            self.command_buckets[name] = TokenBucket(*command_limit)
+
+    def buckets(self, name, user_id):
+        if name in self.user_buckets:
+            yield self.user_buckets[name], user_id
+        if name in self.command_buckets:
+            yield self.command_buckets[name], 0
+        if self.global_bucket and name not in self.global_exempt:
+            yield self.global_bucket, 0
+
+    def acquire(self, name, user_id):
+        """Takes a token from every bucket of the command, returns 0 or the seconds until it can be used again."""
+        now = time.monotonic()
+        buckets = list(self.buckets(name, user_id))
+        retry_after = max((bucket.retry_after(key, now) for bucket, key in buckets), default=0.0)
+        if not retry_after:
+            for bucket, key in buckets:
+                bucket.consume(key, now)
+        return retry_after
+
+    def refund(self, name, user_id):
+        for bucket, key in self.buckets(name, user_id):
+            bucket.refund(key)
@@ -1,20 +1,109 @@
-import importlib
+import os
+import sys
+import json
 import pathlib
 import logging
+import importlib
+from config import config
+from profiler import startup_profile
 from utils import HelperException
+from cmd_manager import dispatcher
+from cmd_manager.bot_args import command_options, add_placeholder
+
+# command names, parser options and source mtimes of every module, used by the lazy mode
+manifest_path = pathlib.Path("command_manifest.json")
+# command name -> module name, for commands whose module isn't imported yet
+lazy_commands = {}
 
 
-def load_commands():
+def module_files():
     path = pathlib.Path(__file__).parent
 
     for file_path in path.glob("*"):
         if file_path.name == "__init__.py":
             continue
 
-        mod_name = file_path.stem
         if not file_path.is_file() or file_path.suffix != ".py":
             continue
+        yield file_path.stem, file_path
+
+
+def import_module(mod_name):
+    try:
+        with startup_profile.phase(f"{__package__}.{mod_name}"):
+            return importlib.import_module("." + mod_name, __package__)
+    except HelperException as err:
+        logging.info(err)
+
+
+def get_mtimes(paths):
+    mtimes = {}
+    for path in paths:
         try:
-            mod = importlib.import_module("." + mod_name, __package__)
-        except HelperException as err:
-            logging.info(err)
+            mtimes[str(path)] = os.stat(path).st_mtime
+        except OSError:
+            mtimes[str(path)] = None
+    return mtimes
+
+
+def describe_module(mod_name, file_path):
+    mod = import_module(mod_name)
+    # modules can list further paths their commands depend on, like the spam folder
+    depends = [file_path, *getattr(mod, "manifest_depends", [])]
+    names = [name for name, command in dispatcher.commands.items()
+             if mod is not None and command.func.__module__ == mod.__name__]
+    return {"mtimes": get_mtimes(depends), "commands": {name: command_options[name] for name in names}}
+
+
+def read_manifest():
+    try:
+        with manifest_path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest):
+    try:
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+    except OSError as err:
+        logging.warning(f"Can't write the command manifest: {err}")
+
+
+def load_commands(lazy=None):
+    if lazy is None:
+        lazy = int(config.MAIN.get("lazy_commands", 0))
+
+    if not lazy:
+        for mod_name, _ in module_files():
+            import_module(mod_name)
+        return
+
+    # only modules that changed since the manifest was written are imported now
+    manifest = read_manifest()
+    new_manifest = {}
+    for mod_name, file_path in module_files():
+        entry = manifest.get(mod_name)
+        if entry is None or get_mtimes(entry["mtimes"]) != entry["mtimes"]:
+            entry = describe_module(mod_name, file_path)
+        elif f"{__package__}.{mod_name}" not in sys.modules:
+            for name, options in entry["commands"].items():
+                add_placeholder(name, options)
+                lazy_commands[name] = mod_name
+        new_manifest[mod_name] = entry
+
+    if new_manifest != manifest:
+        write_manifest(new_manifest)
+
+
+def load_command(name):
+    """Import the module of a lazy command, returns if the command can be dispatched."""
+    mod_name = lazy_commands.get(name)
+    if mod_name is not None:
+        import_module(mod_name)
+        for other in [other for other, other_mod in lazy_commands.items() if other_mod == mod_name]:
+            del lazy_commands[other]
+    return name in dispatcher.commands
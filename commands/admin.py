@@ -1,10 +1,17 @@
+import yaml
+import asyncio
 import discord
-from config import help_text
+from config import help_text, help_embed
+from config.load_help import help_store
 from config.globals import *
 from .role_system import roles
-from handle_messages import delete_user_message
+from handle_messages import delete_user_message, dm_cache
 from cmd_manager.filters import is_admin_command
-from utils import get_file, punish_user, prison_inmates
+from cmd_manager.dispatcher import PRIORITY_MODERATION, scheduler
+from downloader import download_to_file
+from utils import punish_user, prison_inmates
+from guild_index import get_member_named
+from metrics import metrics
 from cmd_manager.decorators import register_command, add_argument
 
 
@@ -17,7 +24,7 @@ async def send_message(client, message, args):
     await delete_user_message(message)
 
 
-@register_command('prison', is_admin=is_admin_command, description='Assign prison.')
+@register_command('prison', is_admin=is_admin_command, priority=PRIORITY_MODERATION, description='Assign prison.')
 @add_argument('--user', '-u', help='Name or id from the user')
 @add_argument('--reason', '-r', help='Reason for prison')
 @add_argument('--time', '-t', dest="prison_length", type=int, default=30, help='Length for prison[in Min][0=Reset]')
@@ -29,7 +36,7 @@ async def prison(client, message, args):
         return await message.channel.send(f"Empty username is not allowed!")
 
     server = client.get_guild(EX_SERVER)
-    user = server.get_member_named(args.user.replace("@", "")) or server.get_member(int(args.user))
+    user = get_member_named(server, args.user.replace("@", "")) or server.get_member(int(args.user))
     if not user:
         return await message.channel.send("User not found!")
 
@@ -41,7 +48,7 @@ async def prison(client, message, args):
                     f"{args.reason}\nBy: {message.author.name}")
 
 
-@register_command('purge_channel', is_admin=is_admin_command, description='Purge channel messages.')
+@register_command('purge_channel', is_admin=is_admin_command, priority=PRIORITY_MODERATION, description='Purge channel messages.')
 @add_argument('channel_id', type=int, help='Channel id')
 @add_argument('--reason', '-r', default='bullshit', help='Reason for the purge')
 @add_argument('--number', '-n', dest="number", type=int, default=10, help='Number of messages that will be deleted')
@@ -61,7 +68,7 @@ async def send_welcome(client, message, args):
         if key == "warning":
             await channel.send(content=val)
         else:
-            mes = await channel.send(embed=discord.Embed(description=val, color=333333))
+            mes = await channel.send(embed=help_embed("bot_bot", "welcome_set", key, colour=333333))
             if key == "command_overview":
                 for emoji in roles.keys():
                     await mes.add_reaction(emoji)
@@ -91,7 +98,7 @@ async def send_rules(client, message, args):
 @register_command('send_yaml', is_admin=is_admin_command, description='Sends the newest help yaml.')
 async def send_yaml(client, message, args):
     await delete_user_message(message)
-    await message.channel.send(file=discord.File("config/text_storage.yaml"))
+    await message.channel.send(file=discord.File(help_store.path))
 
 
 @register_command('replace_yaml', is_admin=is_admin_command, description='Replace the help yaml.')
@@ -101,15 +108,27 @@ async def replace_yaml(client, message, args):
     except IndexError:
         return await message.channel.send("Need file as attachment!")
 
-    success = await get_file(url, "config", "text_storage.yaml")
-    if success:
-        await message.channel.send("Replaced file.")
-    else:
-        await message.channel.send("Failed for unknown reasons.")
+    new_path = await download_to_file(url, f"{help_store.path}.new", max_size=2 ** 20)
+    if not new_path:
+        return await message.channel.send("Failed for unknown reasons.")
+
+    try:
+        # parsed before it replaces the old file, lookups switch to the new texts at once
+        await asyncio.get_event_loop().run_in_executor(None, help_store.replace, new_path)
+    except yaml.YAMLError as err:
+        return await message.channel.send(f"Invalid yaml, kept the old file:\n```{str(err)[:1500]}```")
+    await message.channel.send("Replaced file.")
 
 
 @register_command('output_internals', is_admin=is_admin_command, description='Send internal stats')
-async def replace_yaml(client, message, args):
+async def output_internals(client, message, args):
     embed = discord.Embed(description="Internal Stats", color=333333)
     embed.add_field(name="User in prison", value=prison_inmates)
+    embed.add_field(name="Event loop lag", value=f"p50 {metrics.loop_lag.percentile(0.5) * 1000:.1f}ms\n"
+                                                 f"p99 {metrics.loop_lag.percentile(0.99) * 1000:.1f}ms")
+    queued = ", ".join(f"{name}: {n}" for name, n in scheduler.pending.items() if n)
+    embed.add_field(name="Commands", value=f"running {scheduler.running}, waiting {len(scheduler.waiters)}\n"
+                                           f"{queued or 'nothing queued'}")
+    embed.add_field(name="DM cache", value=dm_cache.hit_rates())
+    embed.add_field(name="Latency (s)", value=f"```\n{metrics.summary()[:1000]}```", inline=False)
     await message.channel.send(embed=embed)
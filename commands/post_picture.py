@@ -5,6 +5,8 @@ from handle_messages import delete_user_message
 from cmd_manager.decorators import register_command
 
 spam_folder = config.PICTURE.spam
+# the commands below change with the folder content
+manifest_depends = [spam_folder]
 
 # Spam images
 for file in os.listdir(spam_folder):
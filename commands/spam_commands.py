@@ -1,27 +1,25 @@
 import re
-from utils import set_user_cooldown, user_cooldown
 from handle_messages import delete_user_message, private_msg
+from cmd_manager import dispatcher
+from cmd_manager.ratelimit import Limit
 from cmd_manager.decorators import register_command, add_argument
 
 reg = re.compile(r"<:(\w+):(\d+)>")
 
 
-@register_command('memefont', description='Converts your text into emojis')
+@register_command('memefont', user_limit=Limit(1, 300), supersede=True, description='Converts your text into emojis')
 @add_argument('text', help='Text too convert.')
 async def memefont(client, message, args):
     await delete_user_message(message)
     if len(args.text) > 25:
+        dispatcher.refund("memefont", message.author.id)
         return await private_msg(message, "Max. 25 chars.")
 
     emoji = re.search(reg, args.text)
     if emoji:
+        dispatcher.refund("memefont", message.author.id)
         return await private_msg(message, "Emojis not allowed in the text.")
 
-    if message.author in user_cooldown:
-        return await private_msg(message, "Cooldown, wait 5min.")
-
-    set_user_cooldown(message.author, 300)
-
     chars = {"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"}
     alpha = [chr(x) for x in range(ord("a"), ord("z") + 1)]
     num2words = {"1": 'one', "2": 'two', "3": 'three', "4": 'four', "5": 'five', "6": 'six', "7": 'seven',
@@ -1,217 +1,175 @@
 from utils import HelperException
+engines = {}
 try:
-    import vapoursynth
+    from imaging import vs_engine
+    # getnative and getscaler also need the descale plugin, a worker checks for it on first use, see get_engine.
+    # grain only needs vapoursynth itself
+    engines["vapoursynth"] = vs_engine
 except ImportError:
-    raise HelperException("VapourSynth is not available, stop importing all commands that need vapoursynth.")
+    vs_engine = None
+try:
+    from imaging import numpy_engine
+    engines["numpy"] = numpy_engine
+except ImportError:
+    pass
+if not engines:
+    raise HelperException("Neither VapourSynth nor NumPy is available, stop importing all commands that need them.")
 
 import gc
+import io
 import os
 import argparse
-import random
-import tempfile
 import asyncio
+import statistics
 import logging
 import discord
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot
 from config import config
-from utils import get_file
-from functools import partial
+from downloader import download
+from imaging import pool, plot, peaks
+from imaging.cache import result_cache
+from imaging.scalers import DefineScaler, scaler_dict
 from handle_messages import private_msg_file, private_msg, delete_user_message
+from cmd_manager import dispatcher
+from cmd_manager.ratelimit import Limit
 from cmd_manager.decorators import register_command, add_argument
 
-core = vapoursynth.core
-core.add_cache = False
-imwri = getattr(core, "imwri", getattr(core, "imwrif", None))
 lossy = ["jpg", "jpeg", "gif"]
-
-
-def get_upscaler(kernel=None, b=None, c=None, taps=None):
-    upsizer = getattr(core.resize, kernel.title())
-    if kernel == 'bicubic':
-        upsizer = partial(upsizer, filter_param_a=b, filter_param_b=c)
-    elif kernel == 'lanczos':
-        upsizer = partial(upsizer, filter_param_a=taps)
-
-    return upsizer
-
-
-def get_descaler(kernel=None, b=None, c=None, taps=None):
-    descale = getattr(core.descale_getnative, 'De' + kernel)
-    if kernel == 'bicubic':
-        descale = partial(descale, b=b, c=c)
-    elif kernel == 'lanczos':
-        descale = partial(descale, taps=taps)
-
-    return descale
-
-
-class DefineScaler:
-    def __init__(self, kernel, b=None, c=None, taps=None):
-        self.kernel = kernel
-        self.b = b
-        self.c = c
-        self.taps = taps
-        self.descaler = get_descaler(kernel=kernel, b=b, c=c, taps=taps)
-        self.upscaler = get_upscaler(kernel=kernel, b=b, c=c, taps=taps)
-
-
-scaler_dict = {
-    "Bilinear": DefineScaler("bilinear"),
-    "Bicubic (b=1/3, c=1/3)": DefineScaler("bicubic", b=1/3, c=1/3),
-    "Bicubic (b=0.5, c=0)": DefineScaler(kernel="bicubic", b=.5, c=0),
-    "Bicubic (b=0, c=0.5)": DefineScaler(kernel="bicubic", b=0, c=.5),
-    "Bicubic (b=1, c=0)": DefineScaler(kernel="bicubic", b=1, c=0),
-    "Bicubic (b=0, c=1)": DefineScaler(kernel="bicubic", b=0, c=1),
-    "Bicubic (b=0.2, c=0.5)": DefineScaler(kernel="bicubic", b=.2, c=.5),
-    "Lanczos (3 Taps)": DefineScaler(kernel="lanczos", taps=3),
-    "Lanczos (4 Taps)": DefineScaler(kernel="lanczos", taps=4),
-    "Lanczos (5 Taps)": DefineScaler(kernel="lanczos", taps=5),
-    "Spline16": DefineScaler(kernel="spline16"),
-    "Spline36": DefineScaler(kernel="spline36"),
-    }
+max_pictures = 5
+combine_methods = {"median": statistics.median, "mean": statistics.mean}
+default_engine = next(iter(engines))
+# whether the workers have the descale plugin, None until a job checked it
+descale_available = None
 
 
 class GetNative:
-    user_cooldown = set()
-
-    def __init__(self, msg_author, img_url, fn, scaler, ar, min_h, max_h):
+    # the fast search screens every height on strips of the picture, then runs the full measurement around the
+    # search_candidates strongest dips of the screen, enough to catch every height the peak detection can report
+    search_candidates = 12
+    # called with (heights, errors), returns an imaging.peaks.PeakResult
+    peak_detector = staticmethod(peaks.detect_peaks)
+
+    def __init__(self, msg_author, img_urls, fn, scaler, ar, min_h, max_h, fast=False, engine=default_engine,
+                 combine="median"):
         self.msg_author = msg_author
-        self.img_url = img_url
+        self.img_urls = img_urls
         self.filename = fn
         self.scaler = scaler
         self.ar = ar
         self.min_h = min_h
         self.max_h = max_h
+        self.fast = fast
+        self.engine_name = engine
+        self.engine = engines[engine]
+        self.combine = combine
         self.plotScaling = 'log'
         self.txt_output = ""
         self.resolutions = []
-        self.tmp_dir = tempfile.TemporaryDirectory()
-        self.path = self.tmp_dir.name
+        self.heights = []
+        self.images = []
+        self.plot = None
 
     async def run(self):
-        self.user_cooldown.add(self.msg_author)
-        asyncio.get_event_loop().call_later(120, lambda: self.user_cooldown.discard(self.msg_author))
-
-        image = await get_file(self.img_url, self.path, self.filename)
-        if image is None:
+        self.images = await asyncio.gather(*[download(url) for url in self.img_urls])
+        if None in self.images:
+            dispatcher.refund("getnative", self.msg_author)
             return True, "Can't load image. Pls try it again later."
 
-        src = imwri.Read(image)
-        if self.ar is 0:
-            self.ar = src.width / src.height
-        src_luma32 = convert_rgb_gray32(src)
-
-        # descale each individual frame
-        resizer = self.scaler.descaler
-        upscaler = self.scaler.upscaler
-        clip_list = []
-        for h in range(self.min_h, self.max_h + 1):
-            clip_list.append(resizer(src_luma32, getw(self.ar, h), h))
-        full_clip = core.std.Splice(clip_list, mismatch=True)
-        full_clip = upscaler(full_clip, getw(self.ar, src.height), src.height)
-        if self.ar != src.width / src.height:
-            src_luma32 = upscaler(src_luma32, getw(self.ar, src.height), src.height)
-        expr_full = core.std.Expr([src_luma32 * full_clip.num_frames, full_clip], 'x y - abs dup 0.015 > swap 0 ?')
-        full_clip = core.std.CropRel(expr_full, 5, 5, 5, 5)
-        full_clip = core.std.PlaneStats(full_clip)
-        full_clip = core.std.Cache(full_clip)
-
-        tasks_pending = set()
-        futures = {}
-        vals = []
-        for frame_index in range(len(full_clip)):
-            fut = asyncio.ensure_future(asyncio.wrap_future(full_clip.get_frame_async(frame_index)))
-            tasks_pending.add(fut)
-            futures[fut] = frame_index
-            while len(tasks_pending) >= core.num_threads / 2:  # let the bot not use 100% of the cpu
-                tasks_done, tasks_pending = await asyncio.wait(
-                    tasks_pending, return_when=asyncio.FIRST_COMPLETED)
-                vals += [(futures.pop(task), task.result().props.PlaneStatsAverage) for task in tasks_done]
-
-        tasks_done, _ = await asyncio.wait(tasks_pending)
-        vals += [(futures.pop(task), task.result().props.PlaneStatsAverage) for task in tasks_done]
-        vals = [v for _, v in sorted(vals)]
-        ratios, vals, best_value = self.analyze_results(vals)
-        self.save_plot(vals)
-        self.txt_output += 'Raw data:\nResolution\t | Relative Error\t | Relative difference from last\n'
-        for i, error in enumerate(vals):
-            self.txt_output += f'{i + self.min_h:4d}\t\t | {error:.10f}\t\t\t | {ratios[i]:.2f}\n'
-
-        with open(f"{self.path}/{self.filename}.txt", "w") as file_open:
-            file_open.writelines(self.txt_output)
+        scaler = self.scaler
+        key = result_cache.key(b"".join(self.images), "getnative", [len(image) for image in self.images],
+                               scaler.kernel, scaler.b, scaler.c, scaler.taps, self.ar, self.min_h, self.max_h,
+                               "screened" if self.fast else "full", self.engine_name, self.combine,
+                               self.filename)  # the plot title shows the filename
+        cached = await result_cache.get(key)
+        if cached is not None:  # cache hits don't count for the cooldown
+            dispatcher.refund("getnative", self.msg_author)
+            self.ar = cached["ar"]
+            self.txt_output = cached["text"]
+            self.plot = cached["png"]
+            return False, cached["best"]
+
+        errors = await self.measure()
+        self.heights = sorted(errors)
+        vals = [errors[h] for h in self.heights]
+        result = self.analyze_results(vals)
+        self.resolutions = result.resolutions
+        best_value = f"Native resolution(s) (best guess): {self.format_resolutions()}"
+        self.plot = await plot.plot_errors(self.heights, vals, self.filename, self.plotScaling)
+        self.txt_output = self.report(result)
+
+        await result_cache.put(key, {"ar": self.ar, "text": self.txt_output, "best": best_value, "png": self.plot})
 
         return False, best_value
 
+    async def measure(self):
+        if self.fast:
+            return await self.screened_search()
+        return await self.get_errors(range(self.min_h, self.max_h + 1))
+
+    async def get_errors(self, heights):
+        self.ar, errors = await pool.run(self.engine.native_errors, self.images, self.scaler, self.ar, list(heights))
+        combine = combine_methods[self.combine]
+        return {h: combine(vals) for h, vals in errors.items()}
+
+    async def screened_search(self):
+        # a dip sits at one single height, so every height is screened, no sampling that could step over it
+        heights = list(range(self.min_h, self.max_h + 1))
+        screen = await pool.run(self.engine.strip_errors, self.images, self.scaler, self.ar, heights)
+        combine = combine_methods[self.combine]
+        # ranked like the peak detection ranks the full errors, a zero error on the screen is still a dip
+        screen = [combine(screen[h]) + 1e-9 for h in heights]
+        dips = peaks.detect_peaks(heights, screen, threshold=0, max_candidates=self.search_candidates, min_distance=1)
+
+        # the ratio of a dip needs the height below it, telling it's a local maximum needs the ratios beside it
+        heights = set()
+        for dip in dips.resolutions:
+            heights.update(range(max(dip - 2, self.min_h), min(dip + 1, self.max_h) + 1))
+        return await self.get_errors(sorted(heights))
+
     def analyze_results(self, vals):
-        ratios = [0.0]
-        for i in range(1, len(vals)):
-            last = vals[i - 1]
-            current = vals[i]
-            ratios.append(current and last / current)
-        sorted_array = sorted(ratios, reverse=True)  # make a copy of the array because we need the unsorted array later
-        max_difference = sorted_array[0]
-
-        differences = [s for s in sorted_array if s - 1 > (max_difference - 1) * 0.33][:5]
-
-        for diff in differences:
-            current = ratios.index(diff)
-            # don't allow results within 20px of each other
-            for res in self.resolutions:
-                if res - 20 < current < res + 20:
-                    break
-            else:
-                self.resolutions.append(current)
+        return self.peak_detector(self.heights, vals)
+
+    def format_resolutions(self):
+        return f"{'p, '.join([str(r) for r in self.resolutions])}p"
 
+    def report(self, result):
         scaler = self.scaler
         bicubic_params = scaler.kernel == 'bicubic' and f'Scaling parameters:\nb = {scaler.b:.2f}\nc = {scaler.c:.2f}\n' or ''
-        best_values = f"{'p, '.join([str(r + self.min_h) for r in self.resolutions])}p"
-        self.txt_output += f"Resize Kernel: {scaler.kernel}\n{bicubic_params}Native resolution(s) (best guess): " \
-                           f"{best_values}\nPlease check the graph manually for more accurate results\n\n"
-
-        return ratios, vals, f"Native resolution(s) (best guess): {best_values}"
-
-    def save_plot(self, vals):
-        matplotlib.pyplot.style.use('dark_background')
-        matplotlib.pyplot.plot(range(self.min_h, self.max_h + 1), vals, '.w-')
-        matplotlib.pyplot.title(self.filename)
-        matplotlib.pyplot.ylabel('Relative error')
-        matplotlib.pyplot.xlabel('Resolution')
-        matplotlib.pyplot.yscale(self.plotScaling)
-        matplotlib.pyplot.savefig(f'{self.path}/{self.filename}.png')
-        matplotlib.pyplot.clf()
+        lines = [f"Resize Kernel: {scaler.kernel}\n{bicubic_params}Native resolution(s) (best guess): "
+                 f"{self.format_resolutions()}\nPlease check the graph manually for more accurate results\n\n"]
+        if len(self.images) > 1:
+            lines.append(f'Errors combined from {len(self.images)} pictures ({self.combine} per height)\n\n')
+        lines.append('Raw data:\nResolution\t | Relative Error\t | Relative difference from last\n')
+        for height, error, ratio in zip(result.heights, result.errors, result.ratios):
+            lines.append(f'{height:4d}\t\t | {error:.10f}\t\t\t | {ratio:.2f}\n')
+        return "".join(lines)
 
 
 class GetScaler:
-    user_cooldown = set()
 
-    def __init__(self, msg_author, img_url, fn, native_height):
+    def __init__(self, msg_author, img_url, fn, native_height, engine=default_engine):
         self.msg_author = msg_author
         self.img_url = img_url
         self.filename = fn
         self.native_height = native_height
-        self.plotScaling = 'log'
-        self.ar = None
-        self.tmp_dir = tempfile.TemporaryDirectory()
-        self.path = self.tmp_dir.name
+        self.engine_name = engine
+        self.engine = engines[engine]
+        self.image = None
+        self.descaled = None
 
     async def run(self):
-        self.user_cooldown.add(self.msg_author)
-        asyncio.get_event_loop().call_later(120, lambda: self.user_cooldown.discard(self.msg_author))
-
-        image = await get_file(self.img_url, self.path, self.filename)
-        if image is None:
+        self.image = await download(self.img_url)
+        if self.image is None:
+            dispatcher.refund("getscaler", self.msg_author)
             return True, "Can't load image. Pls try it again later."
 
-        src = imwri.Read(image, float_output=True)
-        self.ar = src.width / src.height
-        src_luma32 = convert_rgb_gray32(src)
+        key = result_cache.key(self.image, "getscaler", self.native_height, self.engine_name)
+        cached = await result_cache.get(key)
+        if cached is not None:  # cache hits don't count for the cooldown
+            dispatcher.refund("getscaler", self.msg_author)
+            self.descaled = cached["png"]
+            return False, cached["best"]
 
-        results_bin = {}
-        for name, scaler in scaler_dict.items():
-            error = self.geterror(src_luma32, self.native_height, scaler)
-            results_bin[name] = error
+        results_bin, self.descaled = await pool.run(self.engine.scaler_errors, self.image, self.native_height)
 
         sorted_results = list(sorted(results_bin.items(), key=lambda x: x[1]))
         best_result = sorted_results[0]
@@ -225,77 +183,32 @@ class GetScaler:
             txt_output = "Broken Ouput!" + "\n".join(f"{scaler_name:{longest_key}}  {best_result[1]:7.1%}"
                                                      f"  {value:.10f}" for scaler_name, value in sorted_results)
 
-        for name, scaler in scaler_dict.items():
-            if name == best_result[0]:
-                self.save_images(src, scaler, self.native_height)
-
         end_text = f"Testing scalers for native height: {self.native_height}\n```{txt_output}```\n" \
                    f"Smallest error achieved by \"{best_result[0]}\" ({best_result[1]:.10f})"
 
-        return False, end_text
-
-    def geterror(self, clip, h, scaler):
-        down = scaler.descaler(clip, getw(self.ar, h), h)
-        up = scaler.upscaler(down, getw(self.ar, clip.height), clip.height)
-        smask = core.std.Expr([clip, up], 'x y - abs dup 0.015 > swap 0 ?')
-        smask = core.std.CropRel(smask, 5, 5, 5, 5)
-        mask = core.std.PlaneStats(smask)
-        luma = mask.get_frame(0).props.PlaneStatsAverage
-        return luma
+        await result_cache.put(key, {"best": end_text, "png": self.descaled})
 
-    def save_images(self, src_luma32, scaler, h):
-        src = src_luma32
-        src = scaler.descaler(src, getw(self.ar, h), h)
-        first_out = imwri.Write(src, 'png', f'{self.path}/{self.filename}_source%d.png')
-        first_out.get_frame(0)  # trick vapoursynth into rendering the frame
+        return False, end_text
 
 
 class Grain:
-    user_cooldown = set()
 
     def __init__(self, msg_author, img_url, filename):
         self.img_url = img_url
         self.msg_author = msg_author
         self.filename = filename
-        self.tmp_dir = tempfile.TemporaryDirectory()
-        self.path = self.tmp_dir.name
+        self.grain = None
 
     async def run(self):
-        self.user_cooldown.add(self.msg_author)
-        asyncio.get_event_loop().call_later(120, lambda: self.user_cooldown.discard(self.msg_author))
-
-        image = await get_file(self.img_url, self.path, self.filename)
+        image = await download(self.img_url)
         if image is None:
             return True, "Can't load image. Pls try it again later."
 
-        src = imwri.Read(image)
-        var = random.randint(100, 2000)
-        hcorr = random.uniform(0.0, 1.0)
-        vcorr = random.uniform(0.0, 1.0)
-        src = core.grain.Add(src, var=var, hcorr=hcorr, vcorr=vcorr)
-        first_out = imwri.Write(src, 'png', f'{self.path}/{self.filename}_grain%d.png')
-        first_out.get_frame(0)  # trick vapoursynth into rendering the frame
+        self.grain, var, hcorr, vcorr = await pool.run(vs_engine.add_grain, image)
 
         return False, f"var: {var}, hcorr: {hcorr}, vcorr: {vcorr}"
 
 
-def convert_rgb_gray32(src):
-    matrix_s = '709' if src.format.color_family == vapoursynth.RGB else None
-    src_luma32 = core.resize.Point(src, format=vapoursynth.YUV444PS, matrix_s=matrix_s)
-    src_luma32 = core.std.ShufflePlanes(src_luma32, 0, vapoursynth.GRAY)
-    src_luma32 = core.std.Cache(src_luma32)
-    return src_luma32
-
-
-def getw(ar, h, only_even=True):
-    w = h * ar
-    w = int(round(w))
-    if only_even:
-        w = w // 2 * 2
-
-    return w
-
-
 def to_float(str_value):
     if set(str_value) - set("0123456789./"):
         raise argparse.ArgumentTypeError("Invalid characters in float parameter")
@@ -305,13 +218,34 @@ def to_float(str_value):
         raise argparse.ArgumentTypeError("Exception while parsing float") from None
 
 
-async def check_message(message):
-    if not message.attachments:
+async def get_engine(name):
+    """The engine that runs the descale, numpy stands in for vapoursynth without the plugin. None if neither can."""
+    global descale_available
+    if name == "vapoursynth":
+        if descale_available is None:
+            descale_available = await pool.run(vs_engine.has_descale)
+            if not descale_available:
+                logging.warning("The workers have no descale plugin, getnative and getscaler use numpy")
+        if not descale_available:
+            name = "numpy"
+    return name if name in engines else None
+
+
+async def reject(name, message, answer):
+    dispatcher.refund(name, message.author.id)  # wrong input doesn't count for the cooldown
+    return await private_msg(message, answer)
+
+
+async def check_message(message, pictures=1):
+    attachments = message.attachments[:pictures]
+    if not attachments:
         await private_msg(message, "Picture as attachment is needed.")
-    elif not message.attachments[0].width:
+    elif not all(attachment.width for attachment in attachments):
         await private_msg(message, "Filetype is not allowed!")
-    elif message.attachments[0].width * message.attachments[0].height > 8300000:
+    elif any(attachment.width * attachment.height > 8300000 for attachment in attachments):
         await private_msg(message, "Picture is too big.")
+    elif len({(attachment.width, attachment.height) for attachment in attachments}) > 1:
+        await private_msg(message, "All pictures need the same dimensions.")
     else:
         return True
 
@@ -319,7 +253,7 @@ async def check_message(message):
     return False
 
 
-@register_command('getnative', description='Find the native resolution(s) of upscaled material (mostly anime)')
+@register_command('getnative', concurrency=2, queue_depth=4, user_limit=Limit(1, 120), supersede=True, description='Find the native resolution(s) of upscaled material (mostly anime)')
 @add_argument('--aspect-ratio', '-ar', dest='ar', type=to_float, default=0, help='Force aspect ratio. Only useful for anamorphic input')
 @add_argument('--min-height', '-min', dest="min_h", type=int, default=500, help='Minimum height to consider')
 @add_argument('--max-height', '-max', dest="max_h", type=int, default=1000, help='Maximum height to consider [max 1080 atm]')
@@ -328,44 +262,54 @@ async def check_message(message):
 @add_argument('--bicubic-b', '-b', dest='b', type=to_float, default="1/3", help='B parameter of bicubic resize')
 @add_argument('--bicubic-c', '-c', dest='c', type=to_float, default="1/3", help='C parameter of bicubic resize')
 @add_argument('--lanczos-taps', '-t', dest='taps', type=int, default=3, help='Taps parameter of lanczos resize')
+@add_argument('--fast', '-f', dest='fast', action='store_true', default=False, help='Screen all heights on strips of the picture, measure only around the best dips. The plot and raw data only show the measured heights')
+@add_argument('--engine', '-e', dest='engine', choices=engines.keys(), default=default_engine, help='Engine that descales the picture')
+@add_argument('--combine', dest='combine', choices=combine_methods.keys(), default='median', help=f'How the errors of multiple pictures (max {max_pictures}) are combined')
 async def getnative(client, message, args):
-    if not await check_message(message):
-        return
+    if not await check_message(message, max_pictures):
+        return dispatcher.refund("getnative", message.author.id)
 
-    if message.author.id in GetNative.user_cooldown:
-        return await private_msg(message, "Pls use this command only every 2min.")
-    elif os.path.splitext(message.attachments[0].filename)[1][1:] in lossy:
-        return await private_msg(message, f"No lossy format pls. Lossy formats are:\n{', '.join(lossy)}")
+    attachments = message.attachments[:max_pictures]
+    if any(os.path.splitext(attachment.filename)[1][1:] in lossy for attachment in attachments):
+        return await reject("getnative", message, f"No lossy format pls. Lossy formats are:\n{', '.join(lossy)}")
     elif args.min_h >= message.attachments[0].height:
-        return await private_msg(message, f"Picture is to small or equal for min height {args.min_h}.")
+        return await reject("getnative", message, f"Picture is to small or equal for min height {args.min_h}.")
     elif args.min_h >= args.max_h:
-        return await private_msg(message, f"Your min height is bigger or equal to max height.")
+        return await reject("getnative", message, f"Your min height is bigger or equal to max height.")
     elif args.max_h - args.min_h > 1000:
-        return await private_msg(message, f"Max - min height bigger than 1000 is not allowed")
+        return await reject("getnative", message, f"Max - min height bigger than 1000 is not allowed")
     elif args.max_h > message.attachments[0].height:
         await private_msg(message, f"Your max height cant be bigger than your image dimensions. New max height is {message.attachments[0].height}")
         args.max_h = message.attachments[0].height
 
     if args.kernel is None:
         if args.scaler not in scaler_dict.keys():
-            return await private_msg(message, f'Scaler is not a defined, pls use ">>showscaler".')
+            return await reject("getnative", message, f'Scaler is not a defined, pls use ">>showscaler".')
         scaler = scaler_dict[args.scaler]
     else:
         if args.kernel not in ['spline36', 'spline16', 'lanczos', 'bicubic', 'bilinear']:
-            return await private_msg(message, f'descale: {args.kernel} is not a supported kernel.')
+            return await reject("getnative", message, f'descale: {args.kernel} is not a supported kernel.')
         scaler = DefineScaler(args.kernel, b=args.b, c=args.c, taps=args.taps)
 
+    engine = await get_engine(args.engine)
+    if engine is None:
+        return await reject("getnative", message, "Getnative needs the descale plugin, which is not available right now.")
+
     delete_message = await message.channel.send(file=discord.File(config.PICTURE.spam + "tenor_loading.gif"))
 
     msg_author = message.author.id
-    img_url = message.attachments[0].url
+    img_urls = [attachment.url for attachment in attachments]
     filename = message.attachments[0].filename
-    getn = GetNative(msg_author, img_url, filename, scaler, args.ar, args.min_h, args.max_h)
+    getn = GetNative(msg_author, img_urls, filename, scaler, args.ar, args.min_h, args.max_h, args.fast, engine,
+                     args.combine)
     try:
         import time
         starttime = time.time()
         forbidden_error, best_value = await getn.run()
         print(time.time() - starttime)
+    except asyncio.CancelledError:  # superseded by an edit of the message
+        await delete_user_message(delete_message)
+        raise
     except BaseException as err:
         forbidden_error = True
         best_value = "Error in getnative, can't process your picture."
@@ -379,38 +323,46 @@ async def getnative(client, message, args):
         f"AR: {getn.ar:.2f} ",
         f"B: {scaler.b:.2f} C: {scaler.c:.2f} " if scaler.kernel == "bicubic" else "",
         f"Taps: {scaler.taps} " if scaler.kernel == "lanczos" else "",
+        f"Pictures: {len(getn.images)} ({args.combine}) " if len(getn.images) > 1 else "",
         f"\n{best_value}",
         ])
-        await private_msg_file(message, f"{getn.path}/{filename}.txt", "Output from getnative.")
-        await message.channel.send(file=discord.File(f'{getn.path}/{filename}'), content=f"Input\n{message.author}: \"{message.content}\"")
-        await message.channel.send(file=discord.File(f'{getn.path}/{filename}.png'), content=content)
+        await private_msg_file(message, io.BytesIO(getn.txt_output.encode()), "Output from getnative.", filename=f"{filename}.txt")
+        inputs = [discord.File(io.BytesIO(image), filename=attachment.filename) for image, attachment in zip(getn.images, attachments)]
+        await message.channel.send(files=inputs, content=f"Input\n{message.author}: \"{message.content}\"")
+        await message.channel.send(file=discord.File(io.BytesIO(getn.plot), filename=f"{filename}.png"), content=content)
     else:
         await private_msg(message, best_value)
 
     await delete_user_message(message)
     await delete_user_message(delete_message)
-    getn.tmp_dir.cleanup()
 
 
-@register_command('getscaler', description='Find the best inverse scaler (mostly anime)')
+@register_command('getscaler', concurrency=2, queue_depth=4, user_limit=Limit(1, 120), supersede=True, description='Find the best inverse scaler (mostly anime)')
 @add_argument("--native_height", "-nh", dest="native_height", type=int, default=720, help="Approximated native height. Default is 720")
+@add_argument('--engine', '-e', dest='engine', choices=engines.keys(), default=default_engine, help='Engine that descales the picture')
 async def getscaler(client, message, args):
     if not await check_message(message):
-        return
+        return dispatcher.refund("getscaler", message.author.id)
 
-    if message.author.id in GetScaler.user_cooldown:
-        return await private_msg(message, "Pls use this command only every 2min.")
-    elif os.path.splitext(message.attachments[0].filename)[1][1:] in lossy:
+    if os.path.splitext(message.attachments[0].filename)[1][1:] in lossy:
+        dispatcher.refund("getscaler", message.author.id)
         return await private_msg_file(message, config.PICTURE.spam + "lossy.png", content=f"No lossy format pls. Lossy formats are:\n{', '.join(lossy)}")
 
+    engine = await get_engine(args.engine)
+    if engine is None:
+        return await reject("getscaler", message, "Getscaler needs the descale plugin, which is not available right now.")
+
     delete_message = await message.channel.send(file=discord.File(config.PICTURE.spam + "tenor_loading.gif"))
 
     msg_author = message.author.id
     img_url = message.attachments[0].url
     filename = message.attachments[0].filename
-    gets = GetScaler(msg_author, img_url, filename, args.native_height)
+    gets = GetScaler(msg_author, img_url, filename, args.native_height, engine)
     try:
         forbidden_error, best_value = await gets.run()
+    except asyncio.CancelledError:  # superseded by an edit of the message
+        await delete_user_message(delete_message)
+        raise
     except BaseException as err:
         forbidden_error = True
         best_value = "Error in getscaler, can't process your picture."
@@ -418,23 +370,22 @@ async def getscaler(client, message, args):
     gc.collect()
 
     if not forbidden_error:
-        await message.channel.send(file=discord.File(f'{gets.path}/{filename}'), content=f"Input\n{message.author}: \"{message.content}\"")
-        await message.channel.send(file=discord.File(f'{gets.path}/{filename}_source0.png'), content=f"Output\n{best_value}")
+        await message.channel.send(file=discord.File(io.BytesIO(gets.image), filename=filename), content=f"Input\n{message.author}: \"{message.content}\"")
+        await message.channel.send(file=discord.File(io.BytesIO(gets.descaled), filename=f"{filename}_source0.png"), content=f"Output\n{best_value}")
     else:
         await private_msg(message, best_value)
 
     await delete_user_message(message)
     await delete_user_message(delete_message)
-    gets.tmp_dir.cleanup()
 
 
-@register_command('grain', description='Grain.')
+@register_command('grain', concurrency=2, queue_depth=4, user_limit=Limit(1, 120), supersede=True, description='Grain.')
 async def grain(client, message, args):
     if not await check_message(message):
-        return
+        return dispatcher.refund("grain", message.author.id)
 
-    if message.author.id in Grain.user_cooldown:
-        return await private_msg(message, "Pls use this command only every 2min.")
+    if vs_engine is None:
+        return await reject("grain", message, "Grain needs VapourSynth, which is not available right now.")
 
     delete_message = await message.channel.send(file=discord.File(config.PICTURE.spam + "tenor_loading.gif"))
 
@@ -444,6 +395,9 @@ async def grain(client, message, args):
     gra = Grain(msg_author, img_url, filename)
     try:
         forbidden_error, best_value = await gra.run()
+    except asyncio.CancelledError:  # superseded by an edit of the message
+        await delete_user_message(delete_message)
+        raise
     except BaseException as err:
         forbidden_error = True
         best_value = "Error in Grain, can't process your picture."
@@ -452,7 +406,7 @@ async def grain(client, message, args):
 
     if not forbidden_error:
         try:
-            await message.channel.send(file=discord.File(f'{gra.path}/{filename}_grain0.png'), content=f"Grain <:diGG:302631286118285313>\n{best_value}")
+            await message.channel.send(file=discord.File(io.BytesIO(gra.grain), filename=f"{filename}_grain0.png"), content=f"Grain <:diGG:302631286118285313>\n{best_value}")
         except discord.HTTPException:
             await message.channel.send("Too much grain <:notlikemiya:328621519037005826>")
     else:
@@ -460,7 +414,6 @@ async def grain(client, message, args):
 
     await delete_user_message(message)
     await delete_user_message(delete_message)
-    gra.tmp_dir.cleanup()
 
 
 @register_command('showscaler', description='Show all available scaler.')
@@ -1,7 +1,9 @@
 import aiohttp
 import discord
 import asyncio
+import outbound
 from handle_messages import private_msg_user, private_msg
+from cmd_manager import dispatcher
 from cmd_manager.decorators import register_command, add_argument
 
 
@@ -48,7 +50,8 @@ async def vote(_, message, args):
     for number in range(len(args.options)):
         await ongoing_votes[mes.id]["message"].add_reaction(num2emo[number])
 
-    await run_vote(args.time, mes.id, ongoing_votes, args.lang)
+    # the poll runs on as a side task, the command gives its run slots back once the poll is posted
+    dispatcher.spawn(run_vote(args.time, mes.id, ongoing_votes, args.lang))
 
 
 @register_command('anon_vote', description='Post an anonymous poll.')
@@ -79,11 +82,12 @@ async def anon_vote(_, message, args):
     for number in range(len(args.options)):
         await anon_votes[mes.id]["message"].add_reaction(num2emo[number])
 
-    await run_vote(args.time, mes.id, anon_votes, args.lang)
+    # the poll runs on as a side task, the command gives its run slots back once the poll is posted
+    dispatcher.spawn(run_vote(args.time, mes.id, anon_votes, args.lang))
 
 
 async def check_message(message, args, vo):
-    if len(vo) == 5:
+    if len(vo) >= 5:
         return await private_msg(message, "Too many ongoing votes. Please wait until one is over.")
 
     if args.time < 5:
@@ -119,7 +123,7 @@ async def run_vote(time, mes_id, vo, lang):
             await asyncio.sleep(120)
             await get_message(mes_id, vo)
             embed = vo[mes_id]["message"].embeds[0].set_footer(text=f"Time left: {time - over} min")
-            await vo[mes_id]["message"].edit(embed=embed)
+            await edit_vote(vo[mes_id]["message"], embed=embed)
 
         # get the current message object
         await get_message(mes_id, vo)
@@ -152,13 +156,27 @@ async def run_vote(time, mes_id, vo, lang):
             content = f"{language[lang][2]} **{message.embeds[0].title}** {language[lang][3]}" \
                       f" {''.join([f'**{winner}**, ' for winner in winners])}"
 
-        vo.pop(mes_id)
+        vo.pop(mes_id, None)
         embed = discord.Embed.from_dict(embed)
         embed = embed.set_footer(text=f"Over!!!", icon_url=discord.Embed.Empty)
-        await message.edit(content=content, embed=embed)
+        await edit_vote(message, content=content, embed=embed)
         await message.channel.send(content)
     except MessageDeletedException:
-        return vo.pop(mes_id)
+        pass
+    finally:
+        vo.pop(mes_id, None)  # also when the task is cancelled, else the poll counts against the limit forever
+
+
+async def edit_vote(message, **fields):
+    # vote updates are low priority and pending edits of the same message collapse into the latest
+    await outbound.send(message.channel.id, lambda: message.edit(**fields), outbound.PRIORITY_LOW, message.id,
+                        kind="edit")
+
+
+async def remove_reaction(reaction, user):
+    # anon votes are counted by removing the reaction, that doesn't wait behind the sends and edits of the channel
+    await outbound.send(reaction.message.channel.id, lambda: reaction.remove(user), outbound.PRIORITY_LOW,
+                        kind="reaction")
 
 
 async def remove_vote(reaction, message, user, vo):
@@ -171,18 +189,18 @@ async def remove_vote(reaction, message, user, vo):
     i = emo2num[reaction.emoji]
     embed = message.embeds[0].to_dict()
     embed["fields"][i]["value"] = f"Votes: {reaction.count-1}"
-    await message.edit(embed=discord.Embed.from_dict(embed))
+    await edit_vote(message, embed=discord.Embed.from_dict(embed))
 
 
 async def valid_add(reaction, message, user, vo):
     if user.id in vo[message.id]["overflow"]:
         vo[message.id]["overflow"].append(user.id)
-        await reaction.remove(user)
+        await remove_reaction(reaction, user)
         return False
     elif user.id in vo[message.id]["voted_user"]:
         await private_msg_user(None, "Only 1 vote is allowed!", user)
         vo[reaction.message.id]["overflow"].append(user.id)
-        await reaction.remove(user)
+        await remove_reaction(reaction, user)
         return False
 
     return True
@@ -197,9 +215,9 @@ async def add_vote(reaction, message, user, vo):
     embed = message.embeds[0].to_dict()
     embed["fields"][i]["value"] = f"Votes: {reaction.count-1}"
     if vo[message.id]["anon"]:
-        await reaction.remove(user)
+        await remove_reaction(reaction, user)
         vo[message.id]["options"][i] += 1
         embed["fields"][i]["value"] = f"Votes: {vo[message.id]['options'][i]}"
     else:
         embed["fields"][i]["value"] = f"Votes: {reaction.count-1}"
-    await message.edit(embed=discord.Embed.from_dict(embed))
+    await edit_vote(message, embed=discord.Embed.from_dict(embed))
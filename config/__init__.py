@@ -3,6 +3,7 @@ import dicts
 import logging
 import configparser
 from . import load_help
+from .logs import setup_logging
 
 config = dicts.AttrDict()
 def load_config():
@@ -25,11 +26,11 @@ def load_config():
     else:
         log_level = logging.WARNING
 
-    logging.basicConfig(level=log_level)
-    logging.getLogger('').addHandler(logging.FileHandler("output.log"))
+    setup_logging(log_level, config.get("LOGGING", {}))
 
 
 load_config()
 help_text = load_help.get_help_text
+help_embed = load_help.get_help_embed
 
-__all__ = ['config', 'help_text']
+__all__ = ['config', 'help_text', 'help_embed']
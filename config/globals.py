@@ -6,3 +6,4 @@ EX_ADMIN_CHANNEL = 246368272327507979
 EX_BOT_CHANNEL = 300947822956773376
 EX_FANSUB_CHANNEL = 221920731871707136
 BOT_AUTHOR = 134750562062303232
+EX_PRISON_ROLE = 451076667377582110
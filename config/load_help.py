@@ -1,8 +1,76 @@
+import os
 import yaml
+import hashlib
+import logging
+
+# the libyaml loader parses several times faster, the pure python one is the fallback
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class HelpStore:
+    """
+    The help texts parsed once and served from memory. A lookup re-parses the file only when its mtime
+    and then its hash changed, a new file from replace_yaml is swapped in by replace().
+    """
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None  # (mtime, size) of the file last checked
+        # (hash, texts, embeds built from them), replaced as a whole so a lookup never mixes two versions
+        self.state = (None, {}, {})
+
+    @staticmethod
+    def read(path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        return hashlib.blake2b(raw, digest_size=16).digest(), raw
+
+    def refresh(self):
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return self.state
+
+        digest, raw = self.read(self.path)
+        if digest != self.state[0]:  # a new mtime with the same content needs no parse
+            self.swap(digest, yaml.load(raw, Loader=Loader))
+        self.stamp = stamp
+        return self.state
+
+    def swap(self, digest, data):
+        self.state = (digest, data, {})
+        logging.info(f"Loaded the help texts from {self.path}")
+
+    def replace(self, new_path):
+        """Parses new_path, then moves it over the help file. A file that doesn't parse is left where it is."""
+        digest, raw = self.read(new_path)
+        data = yaml.load(raw, Loader=Loader)
+        os.replace(new_path, self.path)
+        self.swap(digest, data)
+
+    def get(self, category, name):
+        _, data, _ = self.refresh()
+        return data[category][name]
+
+    def embed(self, category, name, key=None, title=None, colour=None):
+        """The text, or its entry key, as embed description. The embed is shared between calls, don't modify it."""
+        _, data, embeds = self.refresh()
+        embed = embeds.get((category, name, key, title, colour))
+        if embed is None:
+            import discord  # only the commands need it, config is imported before discord
+            text = data[category][name] if key is None else data[category][name][key]
+            kwargs = {"title": title} if title is not None else {}
+            if colour is not None:
+                kwargs["colour"] = colour
+            embed = embeds[(category, name, key, title, colour)] = discord.Embed(description=text, **kwargs)
+        return embed
+
+
+help_store = HelpStore("config/text_storage.yaml")
 
 
 def get_help_text(category, name):
-    with open("config/text_storage.yaml", "r") as stream:
-        help_text = yaml.safe_load(stream)
+    return help_store.get(category, name)
+
 
-    return help_text[category][name]
+def get_help_embed(category, name, key=None, title=None, colour=None):
+    return help_store.embed(category, name, key, title, colour)
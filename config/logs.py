@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import logging
+import threading
+import logging.handlers
+import multiprocessing
+from collections import deque
+
+# extra fields of a record that are written to the json log
+fields = ("command", "guild", "channel", "user", "latency")
+# handler of the bot process, its dropped count is exported by metrics
+queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        for field in fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.Handler):
+    """Only appends the records to a bounded queue, a writer thread formats and writes them in batches every interval
+    seconds. Nothing wakes the thread per record, that switch cost the event loop more than writing the record itself.
+    Records beyond max_records pending are dropped and counted."""
+    def __init__(self, handlers, max_records=10000, interval=0.1):
+        super().__init__()
+        self.targets = handlers
+        self.max_records = max_records
+        self.interval = interval
+        self.records = deque()
+        self.dropped = 0
+        self.reported = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="log writer", daemon=True)
+        self.thread.start()
+
+    def handle(self, record):
+        # no handler lock, appending to the deque is thread safe
+        if self.filter(record):
+            self.emit(record)
+
+    def emit(self, record):
+        if len(self.records) >= self.max_records:
+            self.dropped += 1
+        else:
+            self.records.append(record)  # msg and args are merged by the formatters in the writer thread
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+        self.write()
+
+    def write(self):
+        while self.records:
+            record = self.records.popleft()
+            for handler in self.targets:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        if self.dropped > self.reported:
+            record = logging.LogRecord(__name__, logging.WARNING, __file__, 0, "Log queue full, dropped %d records",
+                                       (self.dropped - self.reported,), None)
+            self.reported = self.dropped
+            for handler in self.targets:
+                handler.handle(record)
+
+    def close(self):
+        # called by logging.shutdown at exit, the pending records are still written
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.thread.join()
+        super().close()
+
+
+def started(path):
+    """When the log file was started, so a restart doesn't reset its age. Linux has no creation time in the stat,
+    there it's the time of the first record, or the mtime for a file that doesn't start with one."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return time.time()  # created with the first record
+    if hasattr(stat, "st_birthtime"):
+        return stat.st_birthtime
+    try:
+        with open(path, encoding="utf-8") as f:
+            first = json.loads(f.readline())
+        return time.mktime(time.strptime(first["time"][:19], "%Y-%m-%d %H:%M:%S"))
+    except (OSError, ValueError, KeyError, TypeError):
+        return stat.st_mtime
+
+
+class RotatingHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file reaches max_bytes or is older than max_age seconds."""
+    def __init__(self, filename, max_bytes, backup_count, max_age):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_age = max_age
+        self.opened = started(self.baseFilename)
+
+    def shouldRollover(self, record):
+        if self.max_age and time.time() - self.opened >= self.max_age:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened = time.time()
+
+
+def setup_logging(level, settings):
+    global queue_handler
+    if multiprocessing.current_process().name != "MainProcess":
+        # worker processes log to the console only, the file is rotated by the bot process alone
+        logging.basicConfig(level=level)
+        return None
+
+    file_handler = RotatingHandler(settings.get("path", "output.log"), int(settings.get("max_mb", 10)) * 2 ** 20,
+                                   int(settings.get("backups", 5)), int(settings.get("max_hours", 24)) * 3600)
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    # the event loop only puts records in the queue, a thread formats and writes them
+    queue_handler = LazyQueueHandler([console_handler, file_handler], int(settings.get("queue_size", 10000)))
+    root = logging.getLogger('')
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    return queue_handler
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import heapq
+import atexit
+import asyncio
+import logging
+import discord
+from config import config
+
+# discord only bulk deletes messages younger than 14 days, at most 100 per request
+bulk_max_age = 14 * 24 * 3600 - 60
+bulk_max_count = 100
+
+
+def created_at(message_id):
+    return ((message_id >> 22) + discord.utils.DISCORD_EPOCH) / 1000
+
+
+class DeletionScheduler:
+    """
+    Message deletions due later, kept in one heap of (due, channel id, message id) and run by a single task.
+    Deletions that come due close together are grouped per channel and sent as bulk deletes.
+    The pending ones are written to a json file, so they still happen after a restart.
+    """
+    grace = 1.0  # seconds the task waits past the earliest due time to group the deletions around it
+    save_delay = 1.0  # seconds changes are collected before the file is written
+
+    def __init__(self, path=None):
+        self.path = path
+        self.heap = []
+        self.client = None
+        self.task = None
+        self.wakeup = None  # future the task sleeps on, set when an earlier deletion arrives
+        self.save_handle = None
+        self.requests = 0  # delete requests sent to discord
+        self.deleted = 0
+
+    def schedule(self, message, delay):
+        """Delete the message of a guild channel after delay seconds."""
+        if not isinstance(message.channel, discord.abc.GuildChannel):
+            return
+        due = time.time() + delay
+        earliest = self.heap[0][0] if self.heap else None
+        heapq.heappush(self.heap, (due, message.channel.id, message.id))
+        if earliest is None or due < earliest:
+            self.wake()
+        self.save_later()
+
+    def wake(self):
+        if self.wakeup is not None and not self.wakeup.done():
+            self.wakeup.set_result(None)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = [tuple(entry) for entry in json.load(f)]
+        except (OSError, ValueError) as err:
+            logging.warning(f"Can't read the pending deletions: {err}")
+            return
+        self.heap.extend(entries)
+        heapq.heapify(self.heap)
+        logging.info(f"Loaded {len(entries)} pending deletions")
+
+    def save(self):
+        self.save_handle = None
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.heap, f)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logging.warning(f"Can't write the pending deletions: {err}")
+
+    def save_later(self):
+        if self.path and self.save_handle is None:
+            self.save_handle = asyncio.get_event_loop().call_later(self.save_delay, self.save)
+
+    def start(self, client):
+        if self.task is not None:
+            return
+        self.client = client
+        self.load()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        await self.client.wait_until_ready()
+        loop = asyncio.get_event_loop()
+        while True:
+            wait = self.heap[0][0] + self.grace - time.time() if self.heap else None
+            if wait is None or wait > 0:
+                self.wakeup = loop.create_future()
+                try:
+                    await asyncio.wait_for(self.wakeup, wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = {}  # channel id -> message ids
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                _, channel_id, message_id = heapq.heappop(self.heap)
+                due.setdefault(channel_id, []).append(message_id)
+            self.save_later()
+            for channel_id, message_ids in due.items():
+                try:
+                    await self.delete(channel_id, message_ids)
+                except Exception:
+                    logging.exception(f"Exception while deleting messages in {channel_id}")
+
+    async def delete(self, channel_id, message_ids):
+        channel = self.client.get_channel(channel_id)
+        if channel is None:
+            logging.debug(f"Channel {channel_id} is gone, dropped {len(message_ids)} deletions")
+            return
+
+        now = time.time()
+        recent = [i for i in message_ids if now - created_at(i) < bulk_max_age]
+        # a single message and the old ones take one request each
+        batches = [recent[i:i + bulk_max_count] for i in range(0, len(recent), bulk_max_count)]
+        batches += [[i] for i in message_ids if i not in recent]
+        for batch in batches:
+            try:
+                self.requests += 1
+                await channel.delete_messages([discord.Object(id=i) for i in batch])
+                self.deleted += len(batch)
+            except discord.Forbidden as err:
+                logging.warning(f"Exception while deleting a message: {err}")
+            except discord.HTTPException as err:
+                if len(batch) == 1:
+                    logging.debug(f"Exception while deleting a message: {err}")
+                    continue
+                # a bulk delete fails as a whole when one message can't be deleted, retry them one by one
+                for message_id in batch:
+                    await self.delete(channel_id, [message_id])
+
+
+scheduler = DeletionScheduler(config.get("DELETIONS", {}).get("path", "pending_deletions.json"))
+
+
+def schedule(message, delay):
+    scheduler.schedule(message, delay)
+
+
+def start(client):
+    if scheduler.task is None:
+        atexit.register(scheduler.save)
+    scheduler.start(client)
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import logging
+import aiohttp
+
+MAX_SIZE = 25 * 2 ** 20
+TIMEOUT = 30
+CHUNK_SIZE = 64 * 2 ** 10
+# chunks are collected up to this size before they are written to disk
+WRITE_SIZE = 2 ** 20
+
+# one connection pool for the lifetime of the event loop, bot.main starts a new loop after a disconnect
+session = None
+session_loop = None
+
+
+class DownloadLimitException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __repr__(self):
+        return self.message
+
+
+def get_session():
+    global session, session_loop
+    loop = asyncio.get_event_loop()
+    if session is None or session.closed or session_loop is not loop:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=20))
+        session_loop = loop
+    return session
+
+
+async def close():
+    """Closes the session while its loop still runs, the next download opens a new one."""
+    global session
+    if session is not None and not session.closed and session_loop is asyncio.get_event_loop():
+        await session.close()
+    session = None
+
+
+async def iter_chunks(url, max_size, timeout):
+    async with get_session().get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+        if resp.status != 200:
+            raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+        if resp.content_length is not None and resp.content_length > max_size:
+            raise DownloadLimitException(f"{url} is {resp.content_length} bytes, limit is {max_size}")
+
+        size = 0
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise DownloadLimitException(f"{url} is bigger than {max_size} bytes")
+            yield chunk
+
+
+async def download(url, max_size=MAX_SIZE, timeout=TIMEOUT):
+    buffer = bytearray()
+    try:
+        async for chunk in iter_chunks(url, max_size, timeout):
+            buffer += chunk
+    except (aiohttp.ClientError, asyncio.TimeoutError, DownloadLimitException) as err:
+        logging.warning(f"Download of {url} failed: {err!r}")
+        return None
+    return bytes(buffer)
+
+
+def write_chunks(f, chunks):
+    f.writelines(chunks)
+    chunks.clear()
+
+
+async def download_to_file(url, file_path, max_size=MAX_SIZE, timeout=TIMEOUT):
+    # written next to the target and renamed at the end, the old file stays intact if anything fails
+    loop = asyncio.get_event_loop()
+    part_path = f"{file_path}.part"
+    f = await loop.run_in_executor(None, open, part_path, "wb")
+    done = False
+    try:
+        chunks = []
+        pending = 0
+        async for chunk in iter_chunks(url, max_size, timeout):
+            chunks.append(chunk)
+            pending += len(chunk)
+            if pending >= WRITE_SIZE:
+                await loop.run_in_executor(None, write_chunks, f, chunks)
+                pending = 0
+        await loop.run_in_executor(None, write_chunks, f, chunks)
+        await loop.run_in_executor(None, f.close)
+        await loop.run_in_executor(None, os.replace, part_path, file_path)
+        done = True
+    except (aiohttp.ClientError, asyncio.TimeoutError, DownloadLimitException, OSError) as err:
+        logging.warning(f"Download of {url} failed: {err!r}")
+        return None
+    finally:
+        if not done:
+            # also when the task is cancelled, so no awaits here
+            f.close()
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+    return file_path
@@ -0,0 +1,78 @@
+import logging
+
+
+def member_keys(member):
+    # the names guild.get_member_named matches
+    keys = {member.name, f"{member.name}#{member.discriminator}"}
+    if member.nick:
+        keys.add(member.nick)
+    return tuple(keys)
+
+
+class GuildIndex:
+    """
+    Maps the member names of a guild to the members, built on the first lookup in the guild.
+    The member events keep it current, discord.py updates the indexed member objects in place.
+    Roles need no index, discord.py already keeps them in a dict by id.
+    """
+    def __init__(self):
+        self.member_names = {}  # guild id -> {name, name#discriminator or nick: {member id: member}}
+        self.entries = {}  # (guild id, member id) -> (member, names it's indexed under)
+
+    def build(self, guild):
+        self.member_names[guild.id] = {}
+        for member in guild.members:
+            self.add(self.member_names[guild.id], guild.id, member, member_keys(member))
+        logging.debug(f"Indexed {len(guild.members)} members of {guild.name}")
+
+    def add(self, names, guild_id, item, keys):
+        self.entries[(guild_id, item.id)] = (item, keys)
+        for key in keys:
+            names.setdefault(key, {})[item.id] = item
+
+    def discard(self, names, guild_id, item_id):
+        _, keys = self.entries.pop((guild_id, item_id), (None, ()))
+        for key in keys:
+            bucket = names.get(key, {})
+            bucket.pop(item_id, None)
+            if not bucket:
+                names.pop(key, None)
+
+    def clear(self, guild=None):
+        """Drops the index of one or all guilds, after a reconnect discord.py creates new guild objects."""
+        if guild is None:
+            self.member_names.clear()
+            self.entries.clear()
+            return
+        self.member_names.pop(guild.id, None)
+        self.entries = {key: entry for key, entry in self.entries.items() if key[0] != guild.id}
+
+    def get_member_named(self, guild, name):
+        if guild.id not in self.member_names:
+            self.build(guild)
+        return next(iter(self.member_names[guild.id].get(name, {}).values()), None)
+
+    def update_member(self, member):
+        names = self.member_names.get(member.guild.id)
+        if names is not None:
+            self.discard(names, member.guild.id, member.id)
+            self.add(names, member.guild.id, member, member_keys(member))
+
+    def remove_member(self, member):
+        names = self.member_names.get(member.guild.id)
+        if names is not None:
+            self.discard(names, member.guild.id, member.id)
+
+    def update_user(self, user):
+        # a new username or discriminator renames the member in every guild the user is in
+        for guild_id in self.member_names:
+            member, _ = self.entries.get((guild_id, user.id), (None, ()))
+            if member is not None:
+                self.update_member(member)
+
+
+index = GuildIndex()
+
+
+def get_member_named(guild, name):
+    return index.get_member_named(guild, name)
@@ -1,18 +1,85 @@
+import time
 import asyncio
+import inspect
 import logging
 import discord
 import datetime
+import outbound
+import deletions
+from collections import OrderedDict
+from metrics import metrics, current_command
+
+
+class DmCache:
+    """Users that rejected a DM are skipped for ttl seconds, the DM channels of the others are kept."""
+    def __init__(self, max_size=4096, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.closed = OrderedDict()  # user id -> time the DM was rejected
+        self.channels = OrderedDict()  # user id -> DM channel, least recently used first
+        self.counters = {"closed_hit": 0, "closed_miss": 0, "channel_hit": 0, "channel_miss": 0}
+
+    def is_closed(self, user_id):
+        rejected = self.closed.get(user_id)
+        if rejected is not None and time.monotonic() - rejected > self.ttl:
+            del self.closed[user_id]  # try again, the user may have opened the DMs meanwhile
+            rejected = None
+        self.counters["closed_hit" if rejected is not None else "closed_miss"] += 1
+        return rejected is not None
+
+    def close(self, user_id):
+        self.channels.pop(user_id, None)
+        self.closed.pop(user_id, None)
+        self.closed[user_id] = time.monotonic()
+        while len(self.closed) > self.max_size:
+            self.closed.popitem(last=False)
+
+    async def channel(self, user):
+        # discord.py only keeps the latest 128 DM channels, any other one is created again by user.send
+        channel = self.channels.get(user.id) or user.dm_channel
+        if channel is not None:
+            self.counters["channel_hit"] += 1
+        else:
+            self.counters["channel_miss"] += 1
+            channel = await user.create_dm()
+        self.channels.pop(user.id, None)
+        self.channels[user.id] = channel
+        while len(self.channels) > self.max_size:
+            self.channels.popitem(last=False)
+        return channel
+
+    def hit_rates(self):
+        closed = self.counters["closed_hit"] + self.counters["closed_miss"]
+        channel = self.counters["channel_hit"] + self.counters["channel_miss"]
+        return (f"closed DMs {self.counters['closed_hit'] / (closed or 1):.0%} of {closed}, "
+                f"{len(self.closed)} users\nDM channels {self.counters['channel_hit'] / (channel or 1):.0%} "
+                f"of {channel}, {len(self.channels)} kept")
+
+
+dm_cache = DmCache()
+metrics.add_gauge("dm_cache_lookups", "Closed DM and DM channel cache lookups.", lambda: dm_cache.counters)
 
 
 async def handle_msg(message, content=None, embed=None, file=None, user=None, retry_local=True):
     user = user or message.author
     try:
-        await user.send(content=content, embed=embed, file=file)
-    except (AttributeError, discord.Forbidden):
-        if retry_local:
-            del_message = await message.channel.send(content=f"{content or ''}\nThis Message will be deleted in 5min.",
-                                                     embed=embed, file=file)
-            asyncio.get_event_loop().call_later(300, lambda: asyncio.ensure_future(delete_user_message(del_message)))
+        if not dm_cache.is_closed(user.id):
+            channel = await dm_cache.channel(user)
+            with metrics.timed(current_command.get(), "send"):
+                await outbound.send(("dm", user.id), lambda: channel.send(content=content, embed=embed, file=file))
+            return
+    except discord.Forbidden:
+        dm_cache.close(user.id)
+    except AttributeError:
+        pass
+
+    if retry_local:
+        if file is not None:
+            file.reset()  # the dm attempt may have read it already
+        with metrics.timed(current_command.get(), "send"):
+            del_message = await outbound.send(message.channel.id, lambda: message.channel.send(
+                content=f"{content or ''}\nThis Message will be deleted in 5min.", embed=embed, file=file))
+        deletions.schedule(del_message, 300)
 
 
 async def private_msg(message, answer):
@@ -30,8 +97,8 @@ async def private_msg_code(message, answer):
     return True
 
 
-async def private_msg_file(message, file, content=None):
-    await handle_msg(message, file=discord.File(file), content=content)
+async def private_msg_file(message, file, content=None, filename=None):
+    await handle_msg(message, file=discord.File(file, filename=filename), content=content)
     return True
 
 
@@ -50,10 +117,85 @@ async def delete_user_message(message):
             logging.debug(f"Exception while deleting a message: {err}")
 
 
-async def send_log_message(title, desc, member, colour, client):
-    channel = client.get_channel(338293663677546496)
-    embed = discord.Embed(title=" ", description=desc, colour=colour)
-    embed.set_author(name=title, icon_url=member.avatar_url)
-    embed.set_footer(text=datetime.datetime.now().strftime('%H:%M:%S %Y-%m-%d'))
-    await channel.send(embed=embed)
+class LogSink:
+    """Collects the member log events for a short window and sends them packed into few messages."""
+    window = 2.0  # seconds events are collected before they are sent
+    flood = 30  # from that many events on, one summary embed is sent
+    per_message = 10  # events per message, discord allows 10 embeds
+
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        self.channel = None
+        self.pending = []  # (title, desc, member name, avatar url, colour, time stamp)
+        self.flush_task = None
+        # discord.py before 2.0 can only send one embed per message, then the events become fields of one embed
+        self.multi_embeds = "embeds" in inspect.signature(discord.abc.Messageable.send).parameters
+
+    def add(self, client, title, desc, member, colour):
+        if self.channel is None:
+            self.channel = client.get_channel(self.channel_id)
+        self.pending.append((title, desc, member.display_name, member.avatar_url, colour,
+                             datetime.datetime.now().strftime('%H:%M:%S %Y-%m-%d')))
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.ensure_future(self.flush(client))
+
+    async def flush(self, client):
+        while self.pending:
+            await asyncio.sleep(self.window)
+            events, self.pending = self.pending, []
+            if self.channel is None:
+                self.channel = client.get_channel(self.channel_id)
+                if self.channel is None:
+                    logging.warning(f"Log channel {self.channel_id} not found, dropped {len(events)} events")
+                    continue
+
+            if len(events) >= self.flood:
+                messages = [{"embed": self.summary_embed(events)}]
+            else:
+                chunks = [events[i:i + self.per_message] for i in range(0, len(events), self.per_message)]
+                if self.multi_embeds:
+                    messages = [{"embeds": [self.event_embed(*event) for event in chunk]} for chunk in chunks]
+                else:
+                    messages = [{"embed": self.event_embed(*chunk[0]) if len(chunk) == 1 else self.chunk_embed(chunk)}
+                                for chunk in chunks]
+
+            for kwargs in messages:
+                try:
+                    with metrics.timed("send_log_message", "send"):
+                        await outbound.send(self.channel.id, lambda: self.channel.send(**kwargs), outbound.PRIORITY_LOW)
+                except discord.HTTPException as err:
+                    logging.warning(f"Exception while sending the member log: {err}")
+
+    @staticmethod
+    def event_embed(title, desc, name, avatar_url, colour, stamp):
+        embed = discord.Embed(title=" ", description=desc, colour=colour)
+        embed.set_author(name=title, icon_url=avatar_url)
+        embed.set_footer(text=stamp)
+        return embed
+
+    @staticmethod
+    def chunk_embed(events):
+        embed = discord.Embed(title=" ", colour=events[-1][4])
+        for title, desc, _, _, _, stamp in events:
+            embed.add_field(name=title, value=f"{desc or ''}\n{stamp}".strip(), inline=False)
+        return embed
+
+    @staticmethod
+    def summary_embed(events):
+        lines = [f"`{stamp[:8]}` {title}" for title, _, _, _, _, stamp in events]
+        description = ""
+        for i, line in enumerate(lines):
+            if len(description) + len(line) > 1900:
+                description += f"... and {len(lines) - i} more"
+                break
+            description += line + "\n"
+        embed = discord.Embed(title=f"{len(events)} member events", description=description, colour=events[-1][4])
+        embed.set_footer(text=f"{events[0][5]} - {events[-1][5]}")
+        return embed
+
+
+log_sink = LogSink(338293663677546496)
+
 
+async def send_log_message(title, desc, member, colour, client):
+    log_sink.add(client, title, desc, member, colour)
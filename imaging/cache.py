@@ -0,0 +1,97 @@
+import os
+import pickle
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from config import config
+
+
+def entry_size(entry):
+    return sum(len(val) for val in entry.values() if isinstance(val, (bytes, str)))
+
+
+class ResultCache:
+    def __init__(self, max_bytes, disk_path=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @staticmethod
+    def key(data, *params):
+        digest = hashlib.sha256(data)
+        digest.update(repr(params).encode())
+        return digest.hexdigest()
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        elif self.disk_path:
+            entry = await asyncio.get_event_loop().run_in_executor(None, self.read_disk, key)
+            if entry is not None:
+                self.put_memory(key, entry)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def put(self, key, entry):
+        self.put_memory(key, entry)
+        if self.disk_path:
+            await asyncio.get_event_loop().run_in_executor(None, self.write_disk, key, entry)
+
+    def put_memory(self, key, entry):
+        if key in self.entries:
+            self.size -= entry_size(self.entries.pop(key))
+        self.entries[key] = entry
+        self.size += entry_size(entry)
+        while self.size > self.max_bytes and self.entries:
+            _, old = self.entries.popitem(last=False)
+            self.size -= entry_size(old)
+
+    def read_disk(self, key):
+        file_path = os.path.join(self.disk_path, key)
+        try:
+            with open(file_path, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(file_path)  # mtime is the lru order on disk
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as err:
+            logging.warning(f"Can't read cached result {key}: {err}")
+            return None
+
+    def write_disk(self, key, entry):
+        try:
+            with open(os.path.join(self.disk_path, key), "wb") as f:
+                pickle.dump(entry, f)
+
+            files = sorted(os.scandir(self.disk_path), key=lambda e: e.stat().st_mtime)
+            disk_size = sum(e.stat().st_size for e in files)
+            for old in files:
+                if disk_size <= self.disk_max_bytes:
+                    break
+                disk_size -= old.stat().st_size
+                os.remove(old.path)
+        except OSError as err:
+            logging.warning(f"Can't write cached result {key}: {err}")
+
+
+def create_cache():
+    settings = config.get("CACHE", {})
+    return ResultCache(int(settings.get("memory_mb", 64)) * 2 ** 20,
+                       settings.get("disk_path") or None,
+                       int(settings.get("disk_mb", 512)) * 2 ** 20)
+
+
+result_cache = create_cache()
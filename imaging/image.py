@@ -0,0 +1,25 @@
+import io
+import numpy as np
+from PIL import Image
+
+
+def decode(data):
+    # height x width x planes, uint8 or uint16 like the source
+    with Image.open(io.BytesIO(data)) as img:
+        if img.mode in ("L", "LA"):
+            return np.asarray(img.convert("L"))[..., None]
+        elif img.mode.startswith("I;16"):
+            return np.asarray(img, np.uint16)[..., None]
+        return np.asarray(img.convert("RGB"))
+
+
+def normalize(array):
+    return array.astype(np.float32) / (65535 if array.dtype == np.uint16 else 255)
+
+
+def encode_png(array):
+    if array.dtype == np.float32:
+        array = np.rint(np.clip(array, 0, 1) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(array[..., 0] if array.shape[2] == 1 else array).save(buffer, "png")
+    return buffer.getvalue()
@@ -0,0 +1,283 @@
+import numpy as np
+from typing import NamedTuple
+from functools import lru_cache
+from .scalers import scaler_dict, getw
+from .image import decode, normalize, encode_png
+
+# heights solved together, every height in a batch costs about 15MB
+batch_size = 8
+# columns and rows of the one-pass strips that screen every height for the fast search
+strip_lines = 64
+
+
+class Descaler(NamedTuple):
+    up_idx: np.ndarray  # hi x taps, upscale matrix A in gather form (see kernel_weights)
+    up_weights: np.ndarray
+    down_idx: np.ndarray  # lo x taps, transposed matrix A^T in gather form
+    down_weights: np.ndarray
+    lower: np.ndarray  # lo x (p + 1), lower[i, k] = L[i, i - p + k] of the cholesky factor of A^T A
+    upper: np.ndarray  # lo x p, upper[i, k] = L[i + 1 + k, i]
+
+
+def bicubic_kernel(b, c):
+    def kernel(x):
+        x = np.abs(x)
+        near = ((12 - 9 * b - 6 * c) * x ** 3 + (-18 + 12 * b + 6 * c) * x ** 2 + (6 - 2 * b)) / 6
+        far = ((-b - 6 * c) * x ** 3 + (6 * b + 30 * c) * x ** 2 + (-12 * b - 48 * c) * x + (8 * b + 24 * c)) / 6
+        return np.where(x < 1, near, np.where(x < 2, far, 0.0))
+    return kernel
+
+
+def lanczos_kernel(taps):
+    def kernel(x):
+        return np.where(np.abs(x) < taps, np.sinc(x) * np.sinc(x / taps), 0.0)
+    return kernel
+
+
+def spline16_kernel(x):
+    x = np.abs(x)
+    near = ((x - 9 / 5) * x - 1 / 5) * x + 1
+    far = ((-1 / 3 * (x - 1) + 4 / 5) * (x - 1) - 7 / 15) * (x - 1)
+    return np.where(x < 1, near, np.where(x < 2, far, 0.0))
+
+
+def spline36_kernel(x):
+    x = np.abs(x)
+    near = ((13 / 11 * x - 453 / 209) * x - 3 / 209) * x + 1
+    mid = ((-6 / 11 * (x - 1) + 270 / 209) * (x - 1) - 156 / 209) * (x - 1)
+    far = ((1 / 11 * (x - 2) - 45 / 209) * (x - 2) + 26 / 209) * (x - 2)
+    return np.where(x < 1, near, np.where(x < 2, mid, np.where(x < 3, far, 0.0)))
+
+
+def get_kernel(kernel, b, c, taps):
+    if kernel == 'bilinear':
+        return lambda x: np.maximum(1 - np.abs(x), 0.0), 1
+    elif kernel == 'bicubic':
+        return bicubic_kernel(b, c), 2
+    elif kernel == 'lanczos':
+        return lanczos_kernel(taps), taps
+    elif kernel == 'spline16':
+        return spline16_kernel, 2
+    elif kernel == 'spline36':
+        return spline36_kernel, 3
+    raise ValueError(f"{kernel} is not a supported kernel")
+
+
+def scaler_params(scaler):
+    return scaler.kernel, scaler.b, scaler.c, scaler.taps
+
+
+def kernel_weights(kernel, b, c, taps, src_dim, dst_dim):
+    # gather form: dst_dim x n source indices and weights, mirrored edges may repeat an index
+    func, support = get_kernel(kernel, b, c, taps)
+    factor = dst_dim / src_dim
+    stretch = min(factor, 1.0)  # downscaling widens the kernel
+    support = support / stretch
+    pos = (np.arange(dst_dim) + 0.5) / factor - 0.5
+    idx = np.floor(pos - support).astype(np.int64)[:, None] + 1 + np.arange(int(np.ceil(support * 2)))
+    weights = func((pos[:, None] - idx) * stretch)
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    # mirror the edges
+    idx %= 2 * src_dim
+    idx = np.where(idx >= src_dim, 2 * src_dim - 1 - idx, idx)
+    return idx, weights
+
+
+def transpose(idx, weights, src_dim):
+    rows = np.repeat(np.arange(len(idx)), idx.shape[1])
+    cols = idx.ravel()
+    order = np.argsort(cols, kind='stable')
+    rows, cols, vals = rows[order], cols[order], weights.ravel()[order]
+    starts = np.searchsorted(cols, np.arange(src_dim))
+    slot = np.arange(len(cols)) - starts[cols]
+
+    t_idx = np.zeros((src_dim, slot.max() + 1), np.int64)
+    t_weights = np.zeros((src_dim, slot.max() + 1))
+    t_idx[cols, slot] = rows
+    t_weights[cols, slot] = vals
+    return t_idx, t_weights
+
+
+@lru_cache(maxsize=1024)
+def resize_weights(kernel, b, c, taps, src_dim, dst_dim):
+    idx, weights = kernel_weights(kernel, b, c, taps, src_dim, dst_dim)
+    return idx, weights.astype(np.float32)
+
+
+@lru_cache(maxsize=1024)
+def descale_weights(kernel, b, c, taps, lo, hi):
+    idx, weights = kernel_weights(kernel, b, c, taps, lo, hi)
+    normal = np.zeros((lo, lo))
+    np.add.at(normal, (idx[:, :, None], idx[:, None, :]), weights[:, :, None] * weights[:, None, :])
+    p = int(np.max(idx.max(axis=1) - idx.min(axis=1)))
+    chol = np.linalg.cholesky(normal)
+
+    rows = np.arange(lo)[:, None]
+    cols = rows - p + np.arange(p + 1)
+    lower = np.where(cols >= 0, chol[rows, np.maximum(cols, 0)], 0.0)
+    cols = rows + 1 + np.arange(p)
+    upper = np.where(cols < lo, chol[np.minimum(cols, lo - 1), rows], 0.0)
+
+    t_idx, t_weights = transpose(idx, weights, lo)
+    return Descaler(idx, weights.astype(np.float32), t_idx, t_weights.astype(np.float32),
+                    lower.astype(np.float32), upper.astype(np.float32))
+
+
+def gather(idx, weights, data):
+    data = np.ascontiguousarray(data)  # row gathers on a transposed view are twice as slow
+    out = weights[:, 0, None] * data[idx[:, 0]]
+    for k in range(1, idx.shape[1]):
+        out += weights[:, k, None] * data[idx[:, k]]
+    return out
+
+
+def solve_batch(descalers, rhs_list):
+    # pad every banded system to the same size, padded rows solve to zero
+    p = max(d.upper.shape[1] for d in descalers)
+    n = max(r.shape[0] for r in rhs_list)
+    m = max(r.shape[1] for r in rhs_list)
+    lower = np.zeros((len(descalers), n, p + 1), np.float32)
+    lower[:, :, p] = 1
+    upper = np.zeros((len(descalers), n, p), np.float32)
+    z = np.zeros((len(descalers), n + p, m), np.float32)
+    for i, (descaler, rhs) in enumerate(zip(descalers, rhs_list)):
+        dp = descaler.upper.shape[1]
+        lower[i, :rhs.shape[0], p - dp:] = descaler.lower
+        upper[i, :rhs.shape[0], :dp] = descaler.upper
+        z[i, p:p + rhs.shape[0], :rhs.shape[1]] = rhs
+
+    # forward substitution L z = r, z is shifted by p rows so z[:, i:i + p] holds the last p results
+    for i in range(n):
+        acc = z[:, p + i]
+        for k in range(p):
+            acc -= lower[:, i, k, None] * z[:, i + k]
+        acc /= lower[:, i, p, None]
+
+    # back substitution L^T x = z
+    x = np.zeros((len(descalers), n + p, m), np.float32)
+    x[:, :n] = z[:, p:]
+    for i in reversed(range(n)):
+        acc = x[:, i]
+        for k in range(p):
+            acc -= upper[:, i, k, None] * x[:, i + 1 + k]
+        acc /= lower[:, i, p, None]
+
+    return [x[i, :r.shape[0], :r.shape[1]] for i, r in enumerate(rhs_list)]
+
+
+def descale_batch(planes, params_list, sizes):
+    # vertical pass, then horizontal on the transposed result; returns each plane transposed (w x h)
+    vert = [descale_weights(*params, h, plane.shape[0]) for plane, params, (_, h) in zip(planes, params_list, sizes)]
+    down = solve_batch(vert, [gather(d.down_idx, d.down_weights, plane) for d, plane in zip(vert, planes)])
+    horz = [descale_weights(*params, w, plane.shape[1]) for plane, params, (w, _) in zip(planes, params_list, sizes)]
+    return solve_batch(horz, [gather(d.down_idx, d.down_weights, plane.T) for d, plane in zip(horz, down)])
+
+
+def upscale(plane_t, params, width, height):
+    up = gather(*resize_weights(*params, plane_t.shape[0], width), plane_t)
+    return gather(*resize_weights(*params, plane_t.shape[1], height), up.T)
+
+
+def plane_error(ref, up):
+    diff = np.abs(ref - up)
+    diff[diff <= 0.015] = 0
+    return float(diff[5:-5, 5:-5].mean())
+
+
+def to_luma(src):
+    if src.shape[2] == 1:
+        return src[..., 0]
+    return src @ np.array([0.2126, 0.7152, 0.0722], np.float32)  # BT.709
+
+
+def batch_errors(srcs, refs, params_list, sizes):
+    errors = []
+    for plane_t, ref, params in zip(descale_batch(srcs, params_list, sizes), refs, params_list):
+        errors.append(plane_error(ref, upscale(plane_t, params, ref.shape[1], ref.shape[0])))
+    return errors
+
+
+def native_errors(images, scaler, ar, heights):
+    srcs = [to_luma(normalize(decode(data))) for data in images]
+    height, width = srcs[0].shape
+    if ar == 0:
+        ar = width / height
+
+    params = scaler_params(scaler)
+    refs = srcs
+    if getw(ar, height) != width:
+        refs = [gather(*resize_weights(*params, width, getw(ar, height)), src.T).T for src in srcs]
+
+    # every (picture, height) pair is one system, pairs of all pictures share the batches
+    pairs = [(i, h) for h in heights for i in range(len(srcs))]
+    errors = {h: [None] * len(srcs) for h in heights}
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        vals = batch_errors([srcs[i] for i, _ in batch], [refs[i] for i, _ in batch],
+                            [params] * len(batch), [(getw(ar, h), h) for _, h in batch])
+        for (i, h), val in zip(batch, vals):
+            errors[h][i] = val
+
+    return ar, errors
+
+
+def axis_errors(strip, ref, params, sizes):
+    # descale and upscale along the first axis only, the lines of a strip are independent of each other
+    errors = {}
+    for start in range(0, len(sizes), batch_size * 8):
+        batch = sizes[start:start + batch_size * 8]
+        descalers = [descale_weights(*params, n, strip.shape[0]) for n in batch]
+        solved = solve_batch(descalers, [gather(d.down_idx, d.down_weights, strip) for d in descalers])
+        for n, down in zip(batch, solved):
+            diff = np.abs(ref - gather(*resize_weights(*params, n, ref.shape[0]), down))[5:-5]
+            diff[diff <= 0.015] = 0
+            errors[n] = float(diff.mean())
+    return errors
+
+
+def strip_errors(images, scaler, ar, heights):
+    """
+    Screens the heights on a few columns and rows of each picture, the columns are descaled to the height and the
+    rows to the width that goes with it. The sum of both follows the error of native_errors closely enough to rank
+    its dips, at a fraction of the cost.
+    """
+    params = scaler_params(scaler)
+    errors = {h: [] for h in heights}
+    for data in images:
+        src = to_luma(normalize(decode(data)))
+        height, width = src.shape
+        pic_ar = ar or width / height
+        columns = src[:, np.linspace(0, width - 1, min(strip_lines, width)).astype(np.int64)]
+        rows = src[np.linspace(0, height - 1, min(strip_lines, height)).astype(np.int64)].T
+        ref_rows = rows
+        if getw(pic_ar, height) != width:
+            ref_rows = gather(*resize_weights(*params, width, getw(pic_ar, height)), rows)
+
+        vertical = axis_errors(columns, columns, params, heights)
+        horizontal = axis_errors(rows, ref_rows, params, sorted({getw(pic_ar, h) for h in heights}))
+        for h in heights:
+            errors[h].append(vertical[h] + horizontal[getw(pic_ar, h)])
+
+    return errors
+
+
+def scaler_errors(data, native_height):
+    src = normalize(decode(data))
+    src_luma = to_luma(src)
+    height, width = src_luma.shape
+    size = (getw(width / height, native_height), native_height)
+
+    results_bin = {}
+    names = list(scaler_dict)
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        params_list = [scaler_params(scaler_dict[name]) for name in batch]
+        sources = [src_luma] * len(batch)
+        results_bin.update(zip(batch, batch_errors(sources, sources, params_list, [size] * len(batch))))
+
+    params = scaler_params(scaler_dict[min(results_bin, key=results_bin.get)])
+    planes = descale_batch(list(np.moveaxis(src, 2, 0)), [params] * src.shape[2], [size] * src.shape[2])
+    descaled = np.stack([plane.T for plane in planes], axis=2)
+
+    return results_bin, encode_png(descaled)
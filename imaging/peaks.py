@@ -0,0 +1,42 @@
+import numpy as np
+from typing import NamedTuple
+
+
+class PeakResult(NamedTuple):
+    heights: np.ndarray
+    errors: np.ndarray
+    ratios: np.ndarray  # error of the previous height / error of this height, 0 without a direct neighbour
+    prominence: np.ndarray  # how far a ratio sticks out compared to the biggest one, 1 is the best peak
+    resolutions: list  # native resolution(s), best guess first
+
+
+def detect_peaks(heights, errors, threshold=0.33, max_candidates=5, min_distance=20):
+    """
+    Native resolutions show up as a sharp drop of the error compared to the height below.
+    Candidates are local maxima of that ratio which reach `threshold` of the biggest drop,
+    heights within `min_distance` of a stronger candidate are suppressed.
+    """
+    heights = np.asarray(heights, np.int64)
+    errors = np.asarray(errors, np.float64)
+
+    ratios = np.zeros(len(errors))
+    adjacent = (heights[1:] - heights[:-1] == 1) & (errors[1:] != 0)  # gaps are left by the fast search
+    ratios[1:][adjacent] = errors[:-1][adjacent] / errors[1:][adjacent]
+
+    padded = np.pad(ratios, 1, constant_values=-np.inf)
+    local_max = (ratios >= padded[:-2]) & (ratios >= padded[2:])
+    max_ratio = ratios.max(initial=0)
+    prominence = (ratios - 1) / (max_ratio - 1) if max_ratio > 1 else np.zeros(len(ratios))
+
+    # strongest first, stable so equal ratios keep the lower height first
+    order = np.argsort(-ratios, kind='stable')
+    order = order[(local_max & (ratios - 1 > (max_ratio - 1) * threshold))[order]][:max_candidates]
+
+    # non-maximum suppression, a candidate is dropped if a stronger one that was kept is too close
+    candidates = heights[order]
+    close = np.abs(candidates[:, None] - candidates[None, :]) < min_distance
+    keep = np.ones(len(candidates), bool)
+    for i in range(1, len(candidates)):
+        keep[i] = not np.any(close[i, :i] & keep[:i])
+
+    return PeakResult(heights, errors, ratios, prominence, candidates[keep].tolist())
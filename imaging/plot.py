@@ -0,0 +1,49 @@
+import io
+import asyncio
+import threading
+
+# matplotlib is imported on the first plot, most bot starts never need it
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    global _template
+    with _template_lock:
+        if _template is None:
+            import matplotlib.style
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            style = matplotlib.style.library['dark_background']
+            _template = {
+                "Figure": Figure,
+                "FigureCanvas": FigureCanvasAgg,
+                "background": style['figure.facecolor'],
+                "foreground": style['text.color'],
+            }
+    return _template
+
+
+def render_plot(heights, vals, title, yscale='log'):
+    # object oriented api only, pyplot keeps global state and can't be used from several threads
+    template = get_template()
+    fig = template["Figure"](facecolor=template["background"])
+    template["FigureCanvas"](fig)
+    ax = fig.add_subplot()
+    ax.set_facecolor(template["background"])
+    ax.plot(heights, vals, '.-', color=template["foreground"])
+    ax.set_title(title, color=template["foreground"])
+    ax.set_ylabel('Relative error', color=template["foreground"])
+    ax.set_xlabel('Resolution', color=template["foreground"])
+    ax.set_yscale(yscale)
+    ax.tick_params(which='both', colors=template["foreground"])
+    for spine in ax.spines.values():
+        spine.set_color(template["foreground"])
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', facecolor=template["background"])
+    return buffer.getvalue()
+
+
+async def plot_errors(heights, vals, title, yscale='log'):
+    return await asyncio.get_event_loop().run_in_executor(None, render_plot, heights, vals, title, yscale)
@@ -0,0 +1,93 @@
+import signal
+import asyncio
+import logging
+import importlib
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import config
+
+executor = None
+admission = None
+
+
+def _init_worker():
+    # ctrl+c is handled by the bot, the workers die with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in ("imaging.vs_engine", "imaging.numpy_engine"):
+        try:
+            engine = importlib.import_module(name)
+            if hasattr(engine, "init_worker"):
+                engine.init_worker()
+        except ImportError:
+            continue
+        except Exception as err:
+            # a broken engine must not take the worker down, the other engine still serves its jobs
+            logging.error(f"Can't initialise {name} in the worker: {err!r}")
+
+
+def _warm_up():
+    return True
+
+
+def _create_executor(workers):
+    # forkserver: the bot process runs threads and must never be forked directly
+    ctx = multiprocessing.get_context("forkserver")
+    # instead of the default "__main__", the engines are imported by each worker itself (no blas threads in the
+    # forkserver). bot.py gets imported again as "__mp_main__" regardless, its setup() keeps the bot out of there
+    ctx.set_forkserver_preload(["imaging.pool"])
+    pool = ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker)
+    # start every worker right away, so the first job doesn't wait for vapoursynth to load
+    for _ in range(workers):
+        pool.submit(_warm_up)
+    return pool
+
+
+def start():
+    global executor, admission
+    if executor is not None:
+        return
+
+    settings = config.get("WORKERS", {})
+    workers = int(settings.get("processes", 0)) or multiprocessing.cpu_count()
+    max_jobs = int(settings.get("max_jobs", 0)) or workers
+    executor = _create_executor(workers)
+    admission = asyncio.Semaphore(max_jobs)
+    logging.info(f"Started {workers} worker processes, {max_jobs} jobs at once")
+
+
+async def run(func, *args):
+    start()
+    loop = asyncio.get_event_loop()
+    await admission.acquire()
+    pool = executor
+    try:
+        future = pool.submit(partial(func, *args))
+    except BaseException as err:
+        admission.release()
+        if isinstance(err, BrokenProcessPool):
+            restart(pool)
+        raise
+    # the slot is held until the worker is done with the job. A cancelled caller only cancels a job that is
+    # still queued, a running one keeps its slot until it finishes
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(admission.release))
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        restart(pool)
+        raise
+
+
+def restart(pool):
+    global executor
+    if executor is pool:
+        logging.error("Worker process died, restarting the pool")
+        executor = _create_executor(pool._max_workers)
+
+
+def shutdown():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False)
+        executor = None
@@ -0,0 +1,31 @@
+class DefineScaler:
+    def __init__(self, kernel, b=None, c=None, taps=None):
+        self.kernel = kernel
+        self.b = b
+        self.c = c
+        self.taps = taps
+
+
+scaler_dict = {
+    "Bilinear": DefineScaler("bilinear"),
+    "Bicubic (b=1/3, c=1/3)": DefineScaler("bicubic", b=1/3, c=1/3),
+    "Bicubic (b=0.5, c=0)": DefineScaler(kernel="bicubic", b=.5, c=0),
+    "Bicubic (b=0, c=0.5)": DefineScaler(kernel="bicubic", b=0, c=.5),
+    "Bicubic (b=1, c=0)": DefineScaler(kernel="bicubic", b=1, c=0),
+    "Bicubic (b=0, c=1)": DefineScaler(kernel="bicubic", b=0, c=1),
+    "Bicubic (b=0.2, c=0.5)": DefineScaler(kernel="bicubic", b=.2, c=.5),
+    "Lanczos (3 Taps)": DefineScaler(kernel="lanczos", taps=3),
+    "Lanczos (4 Taps)": DefineScaler(kernel="lanczos", taps=4),
+    "Lanczos (5 Taps)": DefineScaler(kernel="lanczos", taps=5),
+    "Spline16": DefineScaler(kernel="spline16"),
+    "Spline36": DefineScaler(kernel="spline36"),
+    }
+
+
+def getw(ar, h, only_even=True):
+    w = h * ar
+    w = int(round(w))
+    if only_even:
+        w = w // 2 * 2
+
+    return w
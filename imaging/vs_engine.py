@@ -0,0 +1,201 @@
+import random
+import vapoursynth
+import numpy as np
+from functools import partial
+from concurrent.futures import wait, FIRST_COMPLETED
+from .scalers import scaler_dict, getw
+from .image import decode, normalize, encode_png
+
+# the jobs use the core of the worker process, see init_worker
+core = None
+# width of the center column strip and height of the center row strip that screen every height for the fast search
+strip_size = 128
+formats = {
+    np.dtype(np.uint8): (vapoursynth.RGB24, vapoursynth.GRAY8),
+    np.dtype(np.uint16): (vapoursynth.RGB48, vapoursynth.GRAY16),
+    np.dtype(np.float32): (vapoursynth.RGBS, vapoursynth.GRAYS),
+}
+
+
+def descale_plugin(vs_core):
+    # the getnative build of descale, or the regular plugin with the same functions
+    return getattr(vs_core, "descale_getnative", None) or getattr(vs_core, "descale", None)
+
+
+def has_descale():
+    # a job for the workers, the bot process itself never creates a core
+    return core is not None and descale_plugin(core) is not None
+
+
+def init_worker():
+    global core
+    core = vapoursynth.core
+    core.add_cache = False
+    # load the descale plugin now instead of on the first job, grain works without it
+    if descale_plugin(core) is not None:
+        for scaler in scaler_dict.values():
+            get_descaler(scaler)
+
+
+def get_upscaler(scaler):
+    upsizer = getattr(core.resize, scaler.kernel.title())
+    if scaler.kernel == 'bicubic':
+        upsizer = partial(upsizer, filter_param_a=scaler.b, filter_param_b=scaler.c)
+    elif scaler.kernel == 'lanczos':
+        upsizer = partial(upsizer, filter_param_a=scaler.taps)
+
+    return upsizer
+
+
+def get_descaler(scaler):
+    descale = getattr(descale_plugin(core), 'De' + scaler.kernel)
+    if scaler.kernel == 'bicubic':
+        descale = partial(descale, b=scaler.b, c=scaler.c)
+    elif scaler.kernel == 'lanczos':
+        descale = partial(descale, taps=scaler.taps)
+
+    return descale
+
+
+def clip_from_array(array):
+    rgb, gray = formats[array.dtype]
+    blank = core.std.BlankClip(width=array.shape[1], height=array.shape[0], length=1,
+                               format=rgb if array.shape[2] == 3 else gray)
+
+    def copy_planes(n, f):
+        fout = f.copy()
+        for plane in range(fout.format.num_planes):
+            np.copyto(np.asarray(fout[plane]), array[..., plane])
+        return fout
+
+    return core.std.ModifyFrame(blank, blank, copy_planes)
+
+
+def array_from_clip(clip):
+    frame = clip.get_frame(0)
+    return np.stack([np.asarray(frame[plane]) for plane in range(frame.format.num_planes)], axis=2)
+
+
+def convert_rgb_gray32(src):
+    matrix_s = '709' if src.format.color_family == vapoursynth.RGB else None
+    src_luma32 = core.resize.Point(src, format=vapoursynth.YUV444PS, matrix_s=matrix_s)
+    src_luma32 = core.std.ShufflePlanes(src_luma32, 0, vapoursynth.GRAY)
+    src_luma32 = core.std.Cache(src_luma32)
+    return src_luma32
+
+
+def get_plane_averages(clip):
+    pending = {}
+    vals = [None] * len(clip)
+    for frame_index in range(len(clip)):
+        pending[clip.get_frame_async(frame_index)] = frame_index
+        while len(pending) >= core.num_threads:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                vals[pending.pop(fut)] = fut.result().props.PlaneStatsAverage
+
+    for fut in wait(pending).done:
+        vals[pending[fut]] = fut.result().props.PlaneStatsAverage
+
+    return vals
+
+
+def native_clip(src, scaler, ar, heights):
+    src_luma32 = convert_rgb_gray32(src)
+
+    # descale each individual frame
+    resizer = get_descaler(scaler)
+    upscaler = get_upscaler(scaler)
+    clip_list = []
+    for h in heights:
+        clip_list.append(resizer(src_luma32, getw(ar, h), h))
+    full_clip = core.std.Splice(clip_list, mismatch=True)
+    full_clip = upscaler(full_clip, getw(ar, src.height), src.height)
+    if ar != src.width / src.height:
+        src_luma32 = upscaler(src_luma32, getw(ar, src.height), src.height)
+    expr_full = core.std.Expr([src_luma32 * full_clip.num_frames, full_clip], 'x y - abs dup 0.015 > swap 0 ?')
+    full_clip = core.std.CropRel(expr_full, 5, 5, 5, 5)
+    return core.std.PlaneStats(full_clip)
+
+
+def native_errors(images, scaler, ar, heights):
+    clips = []
+    for data in images:
+        src = clip_from_array(decode(data))
+        if ar == 0:
+            ar = src.width / src.height
+        clips.append(native_clip(src, scaler, ar, heights))
+
+    # all pictures in one graph, the frames of every picture are rendered in the same pipeline
+    full_clip = core.std.Cache(core.std.Splice(clips, mismatch=True))
+    vals = get_plane_averages(full_clip)
+    return ar, {h: vals[i::len(heights)] for i, h in enumerate(heights)}
+
+
+def strip_clip(src, scaler, ar, heights):
+    # the columns keep their width and the rows their height, so descale and resize only run one pass on each
+    src_luma32 = convert_rgb_gray32(src)
+    resizer = get_descaler(scaler)
+    upscaler = get_upscaler(scaler)
+
+    width = min(strip_size, src.width)
+    columns = core.std.Cache(core.std.CropAbs(src_luma32, width, src.height, left=(src.width - width) // 2))
+    vertical = core.std.Splice([resizer(columns, width, h) for h in heights], mismatch=True)
+    vertical = upscaler(vertical, width, src.height)
+    vertical = core.std.Expr([columns * vertical.num_frames, vertical], 'x y - abs dup 0.015 > swap 0 ?')
+
+    height = min(strip_size, src.height)
+    rows = core.std.Cache(core.std.CropAbs(src_luma32, src.width, height, top=(src.height - height) // 2))
+    horizontal = core.std.Splice([resizer(rows, getw(ar, h), height) for h in heights], mismatch=True)
+    horizontal = upscaler(horizontal, getw(ar, src.height), height)
+    if ar != src.width / src.height:
+        rows = upscaler(rows, getw(ar, src.height), height)
+    horizontal = core.std.Expr([rows * horizontal.num_frames, horizontal], 'x y - abs dup 0.015 > swap 0 ?')
+
+    # the frames of the columns first, then the ones of the rows
+    return core.std.Splice([core.std.PlaneStats(core.std.CropRel(vertical, 0, 0, 5, 5)),
+                            core.std.PlaneStats(core.std.CropRel(horizontal, 5, 5, 0, 0))], mismatch=True)
+
+
+def strip_errors(images, scaler, ar, heights):
+    clips = []
+    for data in images:
+        src = clip_from_array(decode(data))
+        clips.append(strip_clip(src, scaler, ar or src.width / src.height, heights))
+    vals = get_plane_averages(core.std.Cache(core.std.Splice(clips, mismatch=True)))
+    # per picture the errors of the columns and of the rows, summed per height
+    per_picture = [vals[i:i + 2 * len(heights)] for i in range(0, len(vals), 2 * len(heights))]
+    return {h: [errs[i] + errs[len(heights) + i] for errs in per_picture] for i, h in enumerate(heights)}
+
+
+def error_mask(clip, h, ar, scaler):
+    down = get_descaler(scaler)(clip, getw(ar, h), h)
+    up = get_upscaler(scaler)(down, getw(ar, clip.height), clip.height)
+    smask = core.std.Expr([clip, up], 'x y - abs dup 0.015 > swap 0 ?')
+    smask = core.std.CropRel(smask, 5, 5, 5, 5)
+    return core.std.PlaneStats(smask)
+
+
+def scaler_errors(data, native_height):
+    src = clip_from_array(normalize(decode(data)))
+    ar = src.width / src.height
+    src_luma32 = convert_rgb_gray32(src)
+
+    # one frame per kernel, so every kernel renders concurrently from the same cached luma clip
+    masks = [error_mask(src_luma32, native_height, ar, scaler) for scaler in scaler_dict.values()]
+    results_bin = dict(zip(scaler_dict, get_plane_averages(core.std.Splice(masks, mismatch=True))))
+
+    best_scaler = scaler_dict[min(results_bin, key=results_bin.get)]
+    descaled = get_descaler(best_scaler)(src, getw(ar, native_height), native_height)
+
+    return results_bin, encode_png(array_from_clip(descaled))
+
+
+def add_grain(data):
+    src = clip_from_array(decode(data))
+    var = random.randint(100, 2000)
+    hcorr = random.uniform(0.0, 1.0)
+    vcorr = random.uniform(0.0, 1.0)
+    src = core.grain.Add(src, var=var, hcorr=hcorr, vcorr=vcorr)
+
+    return encode_png(array_from_clip(src)), var, hcorr, vcorr
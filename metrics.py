@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from contextvars import ContextVar
+from contextlib import contextmanager
+from collections import defaultdict
+from config import config, logs
+
+# upper bounds of the latency histogram buckets in seconds, the last bucket is +Inf
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# latest samples kept per histogram for the percentiles
+ring_size = 256
+# command of the running task, outbound messages are counted for it
+current_command = ContextVar("current_command", default="none")
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "recent", "position")
+
+    def __init__(self):
+        self.counts = array("L", [0] * (len(buckets) + 1))
+        self.total = 0.0
+        self.recent = array("f")  # ring buffer of the latest samples
+        self.position = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(buckets, seconds)] += 1
+        self.total += seconds
+        if len(self.recent) < ring_size:
+            self.recent.append(seconds)
+        else:
+            self.recent[self.position] = seconds
+            self.position = (self.position + 1) % ring_size
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        samples = sorted(self.recent)
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class Metrics:
+    def __init__(self):
+        self.runs = defaultdict(int)  # command -> dispatched runs
+        self.errors = defaultdict(int)  # (command, stage) -> exceptions
+        self.latency = defaultdict(Histogram)  # (command, stage) -> parse, filter, wait, execute or send time
+        self.loop_lag = Histogram()
+        self.gauges = {}  # name -> (help, function returning {command: value})
+
+    @contextmanager
+    def timed(self, command, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors[(command, stage)] += 1
+            raise
+        finally:
+            self.latency[(command, stage)].observe(time.perf_counter() - start)
+
+    def add_gauge(self, name, help_text, func):
+        self.gauges[name] = (help_text, func)
+
+    def summary(self, limit=15):
+        lines = [f"{'command':16} {'runs':>6} {'err':>4} {'p50':>8} {'p99':>8} {'send p99':>8}"]
+        for command in sorted(self.runs, key=self.runs.get, reverse=True)[:limit]:
+            execute = self.latency.get((command, "execute"), Histogram())
+            send = self.latency.get((command, "send"), Histogram())
+            errors = sum(n for (name, _), n in self.errors.items() if name == command)
+            lines.append(f"{command[:16]:16} {self.runs[command]:6d} {errors:4d} {execute.percentile(0.5):8.3f}"
+                         f" {execute.percentile(0.99):8.3f} {send.percentile(0.99):8.3f}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        lines = ["# HELP bot_command_runs_total Dispatched commands.", "# TYPE bot_command_runs_total counter"]
+        lines += [f'bot_command_runs_total{{command="{escape(c)}"}} {n}' for c, n in self.runs.items()]
+        lines += ["# HELP bot_command_errors_total Exceptions per command and stage.",
+                  "# TYPE bot_command_errors_total counter"]
+        lines += [f'bot_command_errors_total{{command="{escape(c)}",stage="{s}"}} {n}'
+                  for (c, s), n in self.errors.items()]
+        lines += ["# HELP bot_command_latency_seconds Time per command and stage.",
+                  "# TYPE bot_command_latency_seconds histogram"]
+        for (command, stage), histogram in self.latency.items():
+            lines += histogram_lines("bot_command_latency_seconds", histogram,
+                                     f'command="{escape(command)}",stage="{stage}"')
+        lines += ["# HELP bot_loop_lag_seconds Delay of a 1s sleep on the event loop.",
+                  "# TYPE bot_loop_lag_seconds histogram"]
+        lines += histogram_lines("bot_loop_lag_seconds", self.loop_lag)
+        for name, (help_text, func) in self.gauges.items():
+            lines += [f"# HELP bot_{name} {help_text}", f"# TYPE bot_{name} gauge"]
+            lines += [f'bot_{name}{{command="{escape(c)}"}} {value}' for c, value in func().items()]
+        return "\n".join(lines) + "\n"
+
+
+def escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def histogram_lines(name, histogram, labels=""):
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*buckets, "+Inf"), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+    labels = labels and f"{{{labels}}}"
+    lines += [f"{name}_sum{labels} {histogram.total}", f"{name}_count{labels} {cumulative}"]
+    return lines
+
+
+def write_file(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+async def monitor_loop_lag(interval=1.0):
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        metrics.loop_lag.observe(max(loop.time() - start - interval, 0.0))
+
+
+async def write_prometheus(path, interval):
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, write_file, path, metrics.prometheus())
+        except OSError as err:
+            logging.warning(f"Can't write the metrics file: {err}")
+
+
+def start():
+    global tasks
+    if tasks:
+        return
+
+    settings = config.get("METRICS", {})
+    tasks = [asyncio.ensure_future(monitor_loop_lag())]
+    if settings.get("path"):
+        tasks.append(asyncio.ensure_future(write_prometheus(settings["path"], int(settings.get("interval", 60)))))
+
+
+metrics = Metrics()
+tasks = []
+metrics.add_gauge("log_records_dropped", "Log records dropped because the log queue was full.",
+                  lambda: {"all": logs.queue_handler.dropped if logs.queue_handler else 0})
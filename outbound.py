@@ -0,0 +1,144 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from cmd_manager.ratelimit import TokenBucket
+
+# lower is sent first when a route has a backlog
+PRIORITY_HIGH = 0  # moderation
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # member log, vote updates
+
+# local limits per kind of request as (requests, seconds) per route, discord rate limits them in separate buckets
+limits = {"send": (5, 5.0), "edit": (5, 5.0), "reaction": (1, 0.25)}
+
+
+class Job:
+    __slots__ = ("factory", "future", "key", "retry", "retries")
+
+    def __init__(self, factory, future, key, retry):
+        self.factory = factory
+        self.future = future
+        self.key = key
+        self.retry = retry
+        self.retries = 0
+
+
+def get_headers(value):
+    # discord.HTTPException and aiohttp errors carry the response with the rate limit headers, aiohttp responses have
+    # them directly. The models discord.py returns for a successful request don't
+    return getattr(getattr(value, "response", value), "headers", None)
+
+
+def get_retry_after(err):
+    if getattr(err, "status", None) != 429:
+        return None
+    headers = get_headers(err) or {}
+    try:
+        return float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1.0)
+    except ValueError:
+        return 1.0
+
+
+class Outbox:
+    """
+    Sends go through one queue per route (channel id or ("dm", user id)) and kind of request (see limits),
+    ordered by priority. A vote edit doesn't wait behind the messages of its channel, a reaction removal behind neither.
+    A local token bucket per route and kind keeps the requests under the discord limit, 429s pause them.
+    Sends with the same key, like edits of one message, collapse into the latest pending one.
+    Only sends queued with retry are sent again after a 429, discord.py already retries its requests itself.
+    """
+    max_retries = 3
+
+    def __init__(self, limits=limits):
+        self.buckets = {kind: TokenBucket(*limit) for kind, limit in limits.items()}
+        self.queues = {}  # (route, kind) -> heap of (priority, order, job)
+        self.workers = {}  # (route, kind) -> task, only while it has jobs
+        self.keyed = {}  # ((route, kind), key) -> pending job
+        self.blocked_until = {}  # (route, kind) -> time, from 429s and rate limit headers
+        self.order = itertools.count()
+        self.collapsed = 0
+
+    def send(self, route, factory, priority=PRIORITY_NORMAL, key=None, retry=False, kind="send"):
+        """Queue `factory()` for the route, returns a future with its result."""
+        lane = (route, kind)
+        job = self.keyed.get((lane, key)) if key is not None else None
+        if job is not None and not job.future.done():
+            job.factory = factory  # only the latest version is sent
+            self.collapsed += 1
+            return job.future
+
+        job = Job(factory, asyncio.get_event_loop().create_future(), key, retry)
+        heapq.heappush(self.queues.setdefault(lane, []), (priority, next(self.order), job))
+        if key is not None:
+            self.keyed[(lane, key)] = job
+        if lane not in self.workers:
+            self.workers[lane] = asyncio.ensure_future(self.drain(lane))
+        return job.future
+
+    def learn(self, lane, headers):
+        """Take the bucket state from the rate limit headers of a response or an error, if the request has them."""
+        if not headers:
+            return
+        try:
+            if int(headers.get("X-RateLimit-Remaining", 1)) == 0:
+                reset_after = float(headers.get("X-RateLimit-Reset-After", 0))
+                self.blocked_until[lane] = max(self.blocked_until.get(lane, 0), time.monotonic() + reset_after)
+        except ValueError:
+            pass
+
+    def wait_time(self, lane):
+        now = time.monotonic()
+        route, kind = lane
+        return max(self.blocked_until.get(lane, now) - now, self.buckets[kind].retry_after(route, now))
+
+    async def drain(self, lane):
+        route, kind = lane
+        queue = self.queues[lane]
+        try:
+            while queue:
+                wait = self.wait_time(lane)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue  # a job with a higher priority may have arrived meanwhile
+
+                priority, _, job = heapq.heappop(queue)
+                if job.key is not None and self.keyed.get((lane, job.key)) is job:
+                    del self.keyed[(lane, job.key)]
+                if job.future.done():  # the caller gave up
+                    continue
+
+                self.buckets[kind].consume(route, time.monotonic())
+                try:
+                    result = await job.factory()
+                except Exception as err:
+                    self.learn(lane, get_headers(err))
+                    retry_after = get_retry_after(err)
+                    if retry_after is not None:
+                        self.blocked_until[lane] = time.monotonic() + retry_after
+                    if retry_after is not None and job.retry and job.retries < self.max_retries:
+                        job.retries += 1
+                        heapq.heappush(queue, (priority, next(self.order), job))
+                        if job.key is not None:
+                            self.keyed.setdefault((lane, job.key), job)
+                        logging.info(f"Rate limited on {route} ({kind}), retry in {retry_after}s")
+                    elif not job.future.done():
+                        job.future.set_exception(err)
+                else:
+                    self.learn(lane, get_headers(result))
+                    if not job.future.done():
+                        job.future.set_result(result)
+        finally:
+            del self.workers[lane]
+            if not queue:
+                del self.queues[lane]
+                if self.blocked_until.get(lane, 0) <= time.monotonic():
+                    self.blocked_until.pop(lane, None)
+
+
+outbox = Outbox()
+
+
+def send(route, factory, priority=PRIORITY_NORMAL, key=None, retry=False, kind="send"):
+    return outbox.send(route, factory, priority, key, retry, kind)
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import logging
+import datetime
+import resource
+from contextlib import contextmanager
+
+
+def get_rss():
+    # current resident memory in bytes, the peak where /proc isn't available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StartupProfiler:
+    def __init__(self, history_path="startup_profile.jsonl"):
+        self.history_path = history_path
+        self.start = time.perf_counter()
+        self.start_rss = get_rss()
+        self.phases = []  # (name, seconds, memory difference in bytes, nesting depth)
+        self.depth = 0
+        self.total = None
+
+    @contextmanager
+    def phase(self, name):
+        if self.total is not None:  # phases after the first ready, like reconnects, aren't part of the startup
+            yield
+            return
+
+        index = len(self.phases)
+        self.phases.append(None)
+        self.depth += 1
+        start, rss = time.perf_counter(), get_rss()
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.phases[index] = (name, time.perf_counter() - start, get_rss() - rss, self.depth)
+
+    def finish(self):
+        """Called once the bot is ready, prints the report and appends it to the history."""
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self.start
+        previous = self.read_history()
+        print(self.report(previous))
+        self.write_history()
+
+    def read_history(self, runs=10):
+        try:
+            with open(self.history_path) as f:
+                lines = f.readlines()[-runs:]
+            return [json.loads(line) for line in lines]
+        except (OSError, ValueError):
+            return []
+
+    def write_history(self):
+        entry = {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "total": self.total,
+            "rss": get_rss(),
+            "phases": {name: [seconds, memory] for name, seconds, memory, _ in self.phases},
+        }
+        try:
+            with open(self.history_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as err:
+            logging.warning(f"Can't write the startup profile: {err}")
+
+    def report(self, previous=()):
+        averages = {}
+        for run in previous:
+            for name, (seconds, _) in run["phases"].items():
+                averages.setdefault(name, []).append(seconds)
+
+        lines = [f"Startup took {self.total:.3f}s, memory {self.start_rss / 2 ** 20:.1f}MB -> {get_rss() / 2 ** 20:.1f}MB"]
+        if previous:
+            lines[0] += f" (last {len(previous)} runs: {sum(run['total'] for run in previous) / len(previous):.3f}s)"
+        for name, seconds, memory, depth in self.phases:
+            line = f"{'  ' * depth}{name:{40 - 2 * depth}} {seconds * 1000:9.1f}ms {memory / 2 ** 20:+8.1f}MB"
+            if name in averages:
+                line += f"  avg {sum(averages[name]) / len(averages[name]) * 1000:9.1f}ms"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+startup_profile = StartupProfiler()
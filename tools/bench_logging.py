@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# Time the event loop spends in logging.info per record: the synchronous FileHandler from before the queue, the
+# QueueHandler/QueueListener pair and config.logs.LazyQueueHandler. All write the same console and json file output,
+# the console goes to /dev/null. "none" is a handler that does nothing, the cost of creating the record.
+# The records come in bursts with idle gaps, like the command log of the bot, then in one flood without a gap.
+# Run from the repository root (bot.ini is needed): python tools/bench_logging.py [records]
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import logs
+
+BURST = 50  # records per burst
+GAP = 0.01  # idle seconds between the bursts
+EXTRA = {"command": "getnative", "guild": "guild", "channel": "channel", "user": "user#0001", "latency": 0.0123}
+
+
+class LegacyQueueHandler(logging.handlers.QueueHandler):
+    # the queue handler before LazyQueueHandler, one QueueListener thread woken per record
+    def prepare(self, record):
+        return record
+
+
+def targets(path, console):
+    file_handler = logs.RotatingHandler(path, 100 * 2 ** 20, 1, 0)
+    file_handler.setFormatter(logs.JsonFormatter())
+    console_handler = logging.StreamHandler(console)
+    console_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    return [console_handler, file_handler]
+
+
+class NoHandler(logging.Handler):
+    def handle(self, record):
+        return True
+
+
+def setup(kind, path, console):
+    handlers = targets(path, console)
+    if kind == "none":
+        return [NoHandler()], lambda: None
+    if kind == "file":
+        return handlers, lambda: None
+    if kind == "queue":
+        records = queue.Queue()
+        listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        return [LegacyQueueHandler(records)], listener.stop
+    handler = logs.LazyQueueHandler(handlers)
+    return [handler], handler.close
+
+
+def measure(kind, count, burst):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.log")
+    with open(os.devnull, "w") as console:
+        handlers, stop = setup(kind, path, console)
+        logger = logging.getLogger(f"bench.{kind}.{burst}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        for handler in handlers:
+            logger.addHandler(handler)
+
+        spent = 0.0
+        for sent in range(0, count, burst):
+            start = time.perf_counter()
+            for i in range(sent, min(sent + burst, count)):
+                logger.info("Command: %s", f">>getnative -min 700 -max {i}", extra=EXTRA)
+            spent += time.perf_counter() - start
+            time.sleep(GAP)
+        stop()
+        dropped = getattr(handlers[0], "dropped", 0)
+        for handler in handlers:
+            logger.removeHandler(handler)
+
+    written = 0
+    if os.path.exists(path):  # the file is opened with the first record
+        with open(path, encoding="utf-8") as f:
+            written = sum(1 for line in f if '"Command: ' in line)
+    return spent / count * 1e6, written, dropped
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'handler':10} {'burst':>6} {'µs/record':>10} {'written':>8} {'dropped':>8}")
+    for burst in (BURST, count):  # a flood above max_records of the lazy handler drops records
+        for kind in ("none", "file", "queue", "lazy"):
+            per_record, written, dropped = measure(kind, count, burst)
+            print(f"{kind:10} {burst:6d} {per_record:10.1f} {written:8d} {dropped:8d}")
+
+
+if __name__ == "__main__":
+    main()
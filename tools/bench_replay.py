@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# Replays synthetic traffic through bot.on_message/on_message_edit -> handle_commands -> dispatcher -> command
+# with fake discord objects and reports messages/second, latency percentiles and allocations per message.
+# Run from the repository root (bot.ini and the spam folder are needed): python tools/bench_replay.py [messages] [--limits]
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import bot
+import outbound
+from cmd_manager import dispatcher
+from fakes import FakeUser, FakeGuild, FakeChannel, FakeMessage
+
+# kind -> (weight, content)
+TRAFFIC = {
+    "chat": (50, "just chatting, nothing to see here"),
+    "mention": (10, "hey <@!1234> look at this"),
+    "help": (5, ">>help"),
+    "spam image": (10, None),  # filled with a command of the spam folder
+    "memefont": (5, ">>memefont hello"),
+    "vote": (5, '>>vote "Best codec?" -o x264 -o x264 -t 10'),
+    "malformed": (5, ">>getnative --min-height abc"),
+    "unterminated": (3, '>>vote "unterminated'),
+    "unknown": (7, ">>notacommand with args"),
+}
+EDIT_SHARE = 0.1  # share of messages that are edits of an earlier command message, half of them unchanged
+
+
+def build_traffic(count, rng):
+    spam = [name for name, command in dispatcher.commands.items() if command.func.__module__ == "commands.post_picture"]
+    kinds = [kind for kind, (_, content) in TRAFFIC.items() if content is not None or (kind == "spam image" and spam)]
+    weights = [TRAFFIC[kind][0] for kind in kinds]
+
+    guild = FakeGuild()
+    channel = FakeChannel(guild)
+    users = [FakeUser(name=f"user{i}") for i in range(50)]
+    guild.members = users
+
+    traffic = []
+    commands = []
+    for _ in range(count):
+        if commands and rng.random() < EDIT_SHARE:
+            before = rng.choice(commands)
+            after = FakeMessage(before.content, before.author, channel, message_id=before.id)
+            if rng.random() < 0.5:
+                after.content += " edited"
+            traffic.append(("edit", before, after))
+            continue
+
+        kind = rng.choices(kinds, weights)[0]
+        content = f">>{rng.choice(spam)}" if kind == "spam image" else TRAFFIC[kind][1]
+        message = FakeMessage(content, rng.choice(users), channel)
+        if content.startswith(">>"):
+            commands.append(message)
+        traffic.append((kind, None, message))
+    return traffic
+
+
+async def replay(traffic, trace=False):
+    latencies = defaultdict(list)
+    peaks = []
+    for kind, before, message in traffic:
+        if trace:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.clear_traces()
+            current = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        if before is None:
+            await bot.on_message(message)
+        else:
+            await bot.on_message_edit(before, message)
+        latencies[kind].append(time.perf_counter() - start)
+        if trace:
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    return latencies, peaks
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    count = int(args[0]) if args else 5000
+    if "--limits" not in sys.argv:
+        # replayed traffic is far above the global limit and the 5 sends per 5s of a dm route
+        dispatcher.limiter.global_bucket = None
+        outbound.outbox = outbound.Outbox({kind: (count * 10, 1.0) for kind in outbound.limits})
+
+    bot.setup()
+    bot.client._connection.user = FakeUser(0, "bot")
+    loop = asyncio.get_event_loop()
+    traffic = build_traffic(count, random.Random(0))
+
+    loop.run_until_complete(replay(traffic[:200]))  # warm up, imports lazy commands
+    start = time.perf_counter()
+    latencies, _ = loop.run_until_complete(replay(traffic))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    _, peaks = loop.run_until_complete(replay(traffic, trace=True))
+    tracemalloc.stop()
+
+    everything = [latency for values in latencies.values() for latency in values]
+    print(f"{count} messages in {elapsed:.2f}s, {count / elapsed:.0f} msgs/s")
+    print(f"latency p50 {percentile(everything, 0.5) * 1e6:.0f}us  p99 {percentile(everything, 0.99) * 1e6:.0f}us")
+    print(f"allocated per message: mean {statistics.mean(peaks) / 1024:.1f}KB  p99 {percentile(peaks, 0.99) / 1024:.1f}KB\n")
+    print(f"{'kind':14} {'count':>6} {'p50 us':>9} {'p99 us':>9}")
+    for kind, values in sorted(latencies.items()):
+        print(f"{kind:14} {len(values):6d} {percentile(values, 0.5) * 1e6:9.0f} {percentile(values, 0.99) * 1e6:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# Messages/second through bot.handle_commands, compared with the old full argparse routing.
+# Run from the repository root (bot.ini and the spam folder are needed): python tools/bench_routing.py [messages]
+
+import argparse
+import asyncio
+import shlex
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import bot
+from cmd_manager import dispatcher
+from cmd_manager.bot_args import parser, HelpException, UnkownCommandException
+from fakes import FakeUser, FakeGuild, FakeChannel, FakeMessage
+
+MESSAGES = [
+    "just chatting, nothing to see here",
+    "another normal message with <@!1234> in it",
+    ">>",
+    ">>notacommand with some args",
+    '>>memefont "hello world"',
+    ">>showscaler",
+    ">>getnative -min 700 -max 900",
+    "yet another message",
+]
+
+
+async def legacy_handle_commands(message):
+    # the routing of handle_commands before the command table lookup
+    if not message.content.startswith(">>") or len(message.content) == 2:
+        return
+
+    try:
+        arg_string = message.clean_content[2:]
+        arg_string = shlex.split(message.clean_content[2:])
+        args = parser.parse_args(arg_string)
+    except (ValueError, HelpException):
+        return
+    except (UnkownCommandException, argparse.ArgumentError):
+        return
+
+    return await dispatcher.handle(args.command, None, message, args)
+
+
+async def dispatch(name, client, message, args):
+    pass
+
+
+async def measure(handler, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await handler(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    author, channel = FakeUser(1), FakeChannel(FakeGuild())
+    messages = [FakeMessage(MESSAGES[i % len(MESSAGES)], author, channel) for i in range(count)]
+
+    bot.setup()
+    bot.client._connection.user = FakeUser(0)  # handle_commands skips the bot's own messages
+    dispatcher.handle = dispatch  # only the routing is measured, no command runs
+
+    loop = asyncio.get_event_loop()
+    before = loop.run_until_complete(measure(legacy_handle_commands, messages))
+    after = loop.run_until_complete(measure(bot.handle_commands, messages))
+    print(f"{len(dispatcher.commands)} commands registered, {count} messages")
+    print(f"before: {before:10.0f} msgs/s")
+    print(f"after:  {after:10.0f} msgs/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
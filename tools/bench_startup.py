@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# Cold start to ready without a gateway: every run is a fresh interpreter that imports bot.py,
+# starts the worker pool and finishes the startup profile like on_ready does.
+# Run from the repository root (bot.ini is needed): python tools/bench_startup.py [runs]
+
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HISTORY = ROOT / "startup_bench.jsonl"
+
+SNIPPET = """
+import bot
+bot.setup()
+bot.startup_profile.history_path = {!r}
+with bot.startup_profile.phase("worker pool"):
+    bot.pool.start()
+bot.startup_profile.finish()
+bot.pool.shutdown()
+""".format(str(HISTORY))
+
+
+def cold_start():
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", SNIPPET], cwd=ROOT, stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if HISTORY.exists():
+        HISTORY.unlink()  # the averages cover this invocation only, not an earlier one with other settings
+    times = []
+    for i in range(runs):
+        seconds, report = cold_start()
+        times.append(seconds)
+        print(f"run {i + 1}: {seconds:.3f}s")
+
+    print(f"\nmin {min(times):.3f}s  median {statistics.median(times):.3f}s  max {max(times):.3f}s")
+    print(f"\nProfile of the last run:\n{report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# Schedules bursts of delayed deletions like handle_msg and on_member_join do, once with one timer and one
+# request per message and once through the deletion scheduler, then restarts the scheduler from its file.
+# Run from the repository root (bot.ini is needed): python tools/check_deletions.py
+
+import asyncio
+import itertools
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import discord
+from deletions import DeletionScheduler
+from fakes import FakeUser, FakeGuild, FakeChannel, FakeMessage, FakeClient
+
+DELAY = 1.0  # stands in for the 300s of the bot
+BURSTS = 5
+PER_BURST = 40  # messages per burst, spread over the channels
+sequence = itertools.count()
+
+
+def snowflake():
+    # real ids carry their creation time, the scheduler only bulk deletes messages younger than 14 days
+    return ((int(time.time() * 1000) - discord.utils.DISCORD_EPOCH) << 22) + next(sequence)
+
+
+def setup():
+    guild = FakeGuild()
+    channels = [FakeChannel(guild) for _ in range(3)]
+    return FakeClient(guild, channels), channels
+
+
+async def send_bursts(channels, schedule):
+    author = FakeUser()
+    for _ in range(BURSTS):
+        for i in range(PER_BURST):
+            schedule(FakeMessage("This Message will be deleted in 5min.", author, channels[i % len(channels)],
+                                 message_id=snowflake()))
+        await asyncio.sleep(0.1)
+
+
+async def naive():
+    _, channels = setup()
+    loop = asyncio.get_event_loop()
+    await send_bursts(channels, lambda message: loop.call_later(
+        DELAY, lambda: asyncio.ensure_future(message.delete())))
+    handles = len(loop._scheduled)
+    await asyncio.sleep(DELAY + 0.5)
+    left = sum(len(channel.messages) for channel in channels)
+    requests = sum(channel.deletes for channel in channels)
+    print(f"naive: {BURSTS * PER_BURST} messages, {handles} pending timers, {requests} requests, {left} left")
+
+
+async def scheduled(path):
+    client, channels = setup()
+    scheduler = DeletionScheduler(path)
+    scheduler.start(client)
+    await send_bursts(channels, lambda message: scheduler.schedule(message, DELAY))
+    pending = len(scheduler.heap)
+    await asyncio.sleep(DELAY + scheduler.grace + 0.5)
+    left = sum(len(channel.messages) for channel in channels)
+    print(f"scheduled: {BURSTS * PER_BURST} messages, {pending} pending in one task, "
+          f"{scheduler.requests} requests, {left} left")
+    scheduler.task.cancel()
+
+
+async def restart(path):
+    client, channels = setup()
+    first = DeletionScheduler(path)
+    first.start(client)
+    await send_bursts(channels, lambda message: first.schedule(message, DELAY))
+    await asyncio.sleep(first.save_delay + 0.1)
+    first.task.cancel()  # the bot goes down before the deletions are due
+
+    second = DeletionScheduler(path)
+    second.start(client)
+    loaded = len(second.heap)
+    await asyncio.sleep(DELAY + second.grace + 0.5)
+    left = sum(len(channel.messages) for channel in channels)
+    print(f"restart: {loaded} deletions loaded from the file, {second.requests} requests, {left} left")
+    second.task.cancel()
+    return left
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        await naive()
+        await scheduled(f"{tmp}/scheduled.json")
+        left = await restart(f"{tmp}/restart.json")
+    if left:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
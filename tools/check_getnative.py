@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Upscales synthetic cel-like frames from a known native height and compares getnative --fast with the full sweep.
+# Both have to report the same resolutions with the native height first, the fast search has to measure at least
+# 10x fewer heights.
+# Run from the repository root (bot.ini is needed): python tools/check_getnative.py [engine]
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from commands.vapoursynth_commands import GetNative
+from imaging import numpy_engine, pool
+from imaging.image import encode_png
+from imaging.scalers import scaler_dict
+
+SCALER = scaler_dict["Bicubic (b=1/3, c=1/3)"]
+# (native width, native height, upscaled width, upscaled height, min height, max height), 1080p frames with the
+# default height range of the command
+CASES = [(1280, 720, 1920, 1080, 500, 1000), (1536, 864, 1920, 1080, 500, 1000), (960, 540, 1920, 1080, 500, 1000)]
+SEEDS = range(3)
+
+
+def frame(width, height, seed):
+    # flat shapes with hard edges and a little noise, like cel animation
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width), 0.5, np.float32)
+    yy, xx = np.mgrid[0:height, 0:width]
+    for _ in range(40):
+        cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(10, height / 3)
+        img[(xx - cx) ** 2 + (yy - cy) ** 2 < r * r] = rng.uniform(0.1, 0.9)
+    img += rng.normal(0, 0.01, img.shape).astype(np.float32)
+    return np.clip(img, 0, 1)
+
+
+def upscale(img, width, height):
+    params = numpy_engine.scaler_params(SCALER)
+    wide = numpy_engine.gather(*numpy_engine.resize_weights(*params, img.shape[1], width), img.T)
+    return numpy_engine.gather(*numpy_engine.resize_weights(*params, img.shape[0], height), wide.T)
+
+
+async def sweep(data, min_h, max_h, fast, engine):
+    getn = GetNative(0, [], "synthetic.png", SCALER, 0, min_h, max_h, fast, engine)
+    getn.images = [data]
+    start = time.perf_counter()
+    errors = await getn.measure()
+    getn.heights = sorted(errors)
+    result = getn.analyze_results([errors[h] for h in getn.heights])
+    return result.resolutions, len(errors), time.perf_counter() - start
+
+
+async def main(engine):
+    failed = False
+    for native_w, native_h, width, height, min_h, max_h in CASES:
+        for seed in SEEDS:
+            # grain on top of the upscale, without it the error at the native height is exactly 0
+            big = upscale(frame(native_w, native_h, seed), width, height)
+            big += np.random.default_rng(seed).normal(0, 0.01, big.shape).astype(np.float32)
+            data = encode_png(big[..., None])
+            full, full_count, full_time = await sweep(data, min_h, max_h, False, engine)
+            fast, fast_count, fast_time = await sweep(data, min_h, max_h, True, engine)
+            ok = full == fast and full[:1] == [native_h] and fast_count * 10 <= full_count
+            failed |= not ok
+            print(f"{native_h}p -> {height}p seed {seed}: full {full} {full_count} heights {full_time:.2f}s, "
+                  f"fast {fast} {fast_count} heights {fast_time:.2f}s {'ok' if ok else 'FAILED'}")
+    pool.shutdown()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main(sys.argv[1] if len(sys.argv) > 1 else "numpy"))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Runs the outbound scheduler against a local fake HTTP endpoint that enforces a rate limit per channel and kind of
+# request (send, edit, reaction) like discord does, and compares it with sending everything at once.
+# Run from anywhere: python tools/check_outbound.py
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from outbound import Outbox, PRIORITY_HIGH, PRIORITY_LOW
+
+LIMIT = 5  # requests per channel, kind and window
+WINDOW = 1.0
+LIMITS = {kind: (LIMIT, WINDOW) for kind in ("send", "edit", "reaction")}
+
+
+class FakeDiscord:
+    def __init__(self):
+        self.windows = {}  # (channel, method) -> (window start, requests)
+        self.log = []  # (route, body) of accepted requests
+        self.rejected = 0
+
+    async def handle(self, request):
+        route = (request.match_info["channel"], request.method)
+        now = time.monotonic()
+        start, count = self.windows.get(route, (now, 0))
+        if now - start >= WINDOW:
+            start, count = now, 0
+
+        reset_after = f"{start + WINDOW - now:.3f}"
+        if count >= LIMIT:
+            self.rejected += 1
+            return web.json_response({"retry_after": float(reset_after)}, status=429,
+                                     headers={"Retry-After": reset_after, "X-RateLimit-Remaining": "0",
+                                              "X-RateLimit-Reset-After": reset_after})
+
+        self.windows[route] = (start, count + 1)
+        self.log.append((route, await request.text()))
+        return web.json_response({}, headers={"X-RateLimit-Limit": str(LIMIT),
+                                              "X-RateLimit-Remaining": str(LIMIT - count - 1),
+                                              "X-RateLimit-Reset-After": reset_after})
+
+
+class RateLimited(Exception):
+    def __init__(self, response):
+        super().__init__("429 Too Many Requests")
+        self.status = response.status
+        self.response = response
+
+
+async def post(session, url, body, method="POST", learn=True):
+    async with session.request(method, url, data=body) as response:
+        if response.status == 429:
+            raise RateLimited(response)
+        # the outbox takes the rate limit state from the headers of the returned response
+        return response if learn else None
+
+
+async def naive(session, base, messages):
+    # everything at once, a 429 is lost
+    results = await asyncio.gather(*[post(session, f"{base}/channels/1/messages", body) for body in messages],
+                                   return_exceptions=True)
+    return sum(isinstance(result, RateLimited) for result in results)
+
+
+async def scheduled(session, base, outbox):
+    url = f"{base}/channels/1/messages"
+    futures = []
+    # a reaction storm: 40 edits of the same vote message, then one moderation message
+    for i in range(40):
+        futures.append(outbox.send(1, lambda i=i: post(session, f"{url}/42", f"vote edit {i}", "PATCH"), PRIORITY_LOW,
+                                   42, kind="edit"))
+    futures.append(outbox.send(1, lambda: post(session, url, "moderation"), PRIORITY_HIGH))
+    for i in range(10):
+        futures.append(outbox.send(1, lambda i=i: post(session, url, f"message {i}")))
+    # an anon vote counted while the channel has a backlog of sends
+    start = time.perf_counter()
+    reaction = outbox.send(1, lambda: post(session, f"{url}/42/reactions", "remove reaction", "DELETE"),
+                           PRIORITY_LOW, kind="reaction")
+    await reaction
+    reaction_time = time.perf_counter() - start
+    await asyncio.gather(*futures)
+    return reaction_time
+
+
+async def main():
+    server = FakeDiscord()
+    app = web.Application()
+    app.router.add_post("/channels/{channel}/messages", server.handle)
+    app.router.add_patch("/channels/{channel}/messages/{message}", server.handle)
+    app.router.add_delete("/channels/{channel}/messages/{message}/reactions", server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async with aiohttp.ClientSession() as session:
+        lost = await naive(session, base, [f"message {i}" for i in range(51)])
+        print(f"naive:     51 sends, {lost} rejected with 429 and lost")
+
+        await asyncio.sleep(WINDOW)
+        server.log.clear()
+        server.rejected = 0
+        outbox = Outbox(LIMITS)
+        start = time.perf_counter()
+        reaction_time = await scheduled(session, base, outbox)
+        elapsed = time.perf_counter() - start
+        bodies = [body for _, body in server.log]
+        sends = [body for (_, method), body in server.log if method == "POST"]
+        print(f"scheduled: 52 sends, {len(bodies)} requests, {outbox.collapsed} edits collapsed, "
+              f"{server.rejected} rejected with 429, {elapsed:.2f}s, reaction removed after {reaction_time:.2f}s")
+        print(f"moderation message was message {sends.index('moderation') + 1}, order: {bodies}")
+
+        assert server.rejected == 0
+        assert sends[0] == "moderation" and "vote edit 39" in bodies and len(bodies) == 13
+        assert reaction_time < WINDOW / 2  # not behind the 11 messages of the channel
+
+        # the local bucket is too generous here, the rate limit headers of the responses pause the route in time
+        await asyncio.sleep(WINDOW)
+        server.log.clear()
+        server.rejected = 0
+        outbox = Outbox({"send": (LIMIT * 4, WINDOW)})
+        url = f"{base}/channels/3/messages"
+        await asyncio.gather(*[outbox.send(3, lambda i=i: post(session, url, f"message {i}")) for i in range(20)])
+        print(f"learned:   20 sends, {len(server.log)} delivered, {server.rejected} rejected with 429")
+        assert len(server.log) == 20 and server.rejected == 0
+
+        # the same without the headers, the 429s pause the route and the sends are retried,
+        # unlike discord.py this sender doesn't retry by itself
+        await asyncio.sleep(WINDOW)
+        server.log.clear()
+        server.rejected = 0
+        outbox = Outbox({"send": (LIMIT * 4, WINDOW)})
+        url = f"{base}/channels/2/messages"
+        # no response for the outbox to learn from, only the 429s tell it about the limit
+        await asyncio.gather(*[outbox.send(2, lambda i=i: post(session, url, f"message {i}", learn=False), retry=True)
+                               for i in range(20)])
+        print(f"retried:   20 sends, {len(server.log)} delivered, {server.rejected} rejected with 429 and retried")
+        assert len(server.log) == 20
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,131 @@
+# Lightweight stand-ins for the discord.py objects the command pipeline touches, no gateway or http involved.
+
+import itertools
+import re
+
+import discord
+
+ids = itertools.count(10 ** 17)
+
+
+class FakeUser:
+    def __init__(self, user_id=None, name="bench"):
+        self.id = next(ids) if user_id is None else user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.avatar_url = ""
+        self.roles = []
+        self.sent = 0
+        self.dm_channel = None
+
+    def __str__(self):
+        return f"{self.name}#0001"
+
+    async def send(self, content=None, embed=None, file=None, **kwargs):
+        self.sent += 1
+        if file is not None:
+            file.close()
+
+    async def create_dm(self):
+        self.dm_channel = self  # the user stands in for its DM channel
+        return self
+
+
+class FakeGuild:
+    def __init__(self, guild_id=None, name="bench"):
+        self.id = next(ids) if guild_id is None else guild_id
+        self.name = name
+        self.roles = []
+        self.members = []
+
+    def get_member(self, user_id):
+        return next((member for member in self.members if member.id == user_id), None)
+
+    def get_member_named(self, name):
+        return next((member for member in self.members if member.name == name), None)
+
+
+class FakeChannel(discord.abc.GuildChannel):
+    def __init__(self, guild, channel_id=None, name="bench"):
+        self.id = next(ids) if channel_id is None else channel_id
+        self.name = name
+        self.guild = guild
+        self.messages = {}
+        self.sent = 0
+        self.deletes = 0  # delete requests, single and bulk
+
+    async def send(self, content=None, embed=None, file=None, files=None, **kwargs):
+        self.sent += 1
+        for f in files or ([file] if file is not None else []):
+            f.close()
+        return FakeMessage(content or "", FakeUser(0, "bot"), self)
+
+    async def fetch_message(self, message_id):
+        try:
+            return self.messages[message_id]
+        except KeyError:
+            raise discord.NotFound(FakeResponse(404), "Unknown Message") from None
+
+    async def delete_messages(self, messages):
+        self.deletes += 1
+        for message in messages:
+            self.messages.pop(message.id, None)
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = ""
+
+
+class FakeMessage:
+    def __init__(self, content, author, channel, attachments=(), message_id=None):
+        self.id = next(ids) if message_id is None else message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.attachments = list(attachments)
+        self.reactions = []
+        self.embeds = []
+        channel.messages[self.id] = self
+
+    @property
+    def guild(self):
+        return self.channel.guild
+
+    @property
+    def clean_content(self):
+        # like discord.py, the replacement regex is rebuilt on every access
+        transformations = {re.escape(f"<@!{self.author.id}>"): "@bench", re.escape(f"<@{self.author.id}>"): "@bench"}
+        pattern = re.compile("|".join(transformations.keys()))
+        return pattern.sub(lambda m: transformations[re.escape(m.group(0))], self.content)
+
+    async def delete(self):
+        self.channel.deletes += 1
+        self.channel.messages.pop(self.id, None)
+
+    async def edit(self, **kwargs):
+        self.content = kwargs.get("content", self.content)
+
+    async def add_reaction(self, emoji):
+        pass
+
+
+class FakeClient:
+    def __init__(self, guild, channels):
+        self.user = FakeUser(0, "bot")
+        self.guilds = [guild]
+        self.channels = {channel.id: channel for channel in channels}
+
+    async def wait_until_ready(self):
+        pass
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_guild(self, guild_id):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    def get_user(self, user_id):
+        return next((member for member in self.guilds[0].members if member.id == user_id), None)
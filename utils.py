@@ -1,11 +1,11 @@
-import aiohttp
 import discord
 import asyncio
 import random
 import logging
 import datetime
-from config.globals import EX_SERVER
-from handle_messages import private_msg_user, delete_user_message
+from config.globals import EX_SERVER, EX_PRISON_ROLE
+import outbound
+from handle_messages import private_msg_user
 
 
 # Exception that you can catch, without the risk other errors not getting through
@@ -18,30 +18,15 @@ class HelperException(Exception):
 
 
 prison_inmates = {}
-user_cooldown = set()
 
 
 def get_role_by_id(server, role_id):
-    for role in server.roles:
-        if role.id == role_id:
-            return role
-    return None
+    # discord.py keeps the roles of a guild in a dict by id
+    return server.get_role(role_id)
 
 
-def has_role(user, role_id):
-    return get_role_by_id(user, role_id) is not None
-
-
-async def get_file(url, path, filename, message=None):
-    async with aiohttp.ClientSession() as sess:
-        async with sess.get(url) as resp:
-            if resp.status != 200:
-                return None
-            if message is not None:
-                await delete_user_message(message)
-            with open(f"{path}/{filename}", 'wb') as f:
-                f.write(await resp.read())
-            return f"{path}/{filename}"
+def has_role(member, role_id):
+    return any(role.id == role_id for role in member.roles)
 
 
 async def check_and_release(client):
@@ -49,12 +34,16 @@ async def check_and_release(client):
         try:
             await asyncio.sleep(60)
 
+            if not prison_inmates:
+                continue
+            guild = client.get_guild(EX_SERVER)
+            if guild is None:  # not connected right now, the next pass tries again
+                continue
+            prison_role = get_role_by_id(guild, EX_PRISON_ROLE)
             for user_id, prison_array in prison_inmates.copy().items():
                 if datetime.datetime.utcnow() >= prison_array[0]:
                     prison_inmates.pop(user_id)
-                    guild = client.get_guild(EX_SERVER)
                     member = guild.get_member(user_id)
-                    prison_role = get_role_by_id(guild, 451076667377582110)
                     try:
                         await member.remove_roles(prison_role)
                     except (discord.Forbidden, discord.HTTPException):
@@ -91,7 +80,7 @@ async def punish_user(client, message, user=None, reason="Stop using this comman
         prison_inmates[user.id] = [timestamp + datetime.timedelta(minutes=prison_length)]
         prison_inmates[user.id].append([role.id for role in user.roles[1:]])
         await user.edit(roles=[role for role in user.roles[1:] if role.managed], reason="Ultimate Prison")
-        prison_role = get_role_by_id(message.guild, 451076667377582110)
+        prison_role = get_role_by_id(message.guild, EX_PRISON_ROLE)
         await user.add_roles(prison_role)
 
     time_string = prison_inmates[user.id][0].strftime('%H:%M:%S %Y-%m-%d')
@@ -104,9 +93,4 @@ async def punish_user(client, message, user=None, reason="Stop using this comman
 
 async def send_mod_channel_message(client, message):
     channel = client.get_channel(246368272327507979)
-    await channel.send(message)
-
-
-def set_user_cooldown(author, time):
-    user_cooldown.add(author)
-    asyncio.get_event_loop().call_later(time, lambda: user_cooldown.discard(author))
+    await outbound.send(channel.id, lambda: channel.send(message), outbound.PRIORITY_HIGH)